@@ -0,0 +1,105 @@
+"""Throughput of downloader.normalize against the previous inline regex code.
+
+Run from the MusicDL directory:  python benchmarks/normalize_benchmark.py [count]
+
+Outputs are compared string by string before anything is timed; a mismatch aborts.
+"""
+import os
+import re
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from downloader import normalize
+
+# Previous implementations, kept verbatim as the reference
+
+def legacy_clean_metadata_value(value):
+    if not value:
+        return None
+    cleaned = str(value).strip()
+    cleaned = re.sub(r'[<>:"/\\|?*]', '', cleaned)
+    if len(cleaned) > 200:
+        cleaned = cleaned[:200]
+    return cleaned if cleaned else None
+
+def legacy_normalize_filename(artist, title):
+    if not artist or not title:
+        return None
+    artist_clean = legacy_clean_metadata_value(artist)
+    title_clean = legacy_clean_metadata_value(title)
+    if not artist_clean or not title_clean:
+        return None
+    base = f"{artist_clean} - {title_clean}"
+    base = re.sub(r'\([^)]*\)', '', base)
+    base = re.sub(r'\[[^\]]*\]', '', base)
+    base = re.sub(r'feat\.?|ft\.?|featuring', '', base, flags=re.IGNORECASE)
+    base = re.sub(r'[^a-zA-Z0-9\s]+', '', base)
+    base = re.sub(r'\s+', ' ', base).strip()
+    return base.lower()
+
+def legacy_clean_video_title(title):
+    title = re.sub(r'\s*\(Official.*?\)', '', title, flags=re.IGNORECASE)
+    title = re.sub(r'\s*\[Official.*?\]', '', title, flags=re.IGNORECASE)
+    title = re.sub(r'\s*\(Lyrics.*?\)', '', title, flags=re.IGNORECASE)
+    title = re.sub(r'\s*\[Lyrics.*?\]', '', title, flags=re.IGNORECASE)
+    return legacy_clean_metadata_value(title)
+
+WORDS = ['Love', 'Night', 'Fire', 'Dance', 'Heart', 'Blue', 'Dreams', 'Café', 'Ñandú', 'Straße',
+         'Motörhead', 'Sigur Rós', 'AC/DC', 'Who?', 'What: Now', '"Quoted"', '東京', 'Ǳ', 'ſ']
+DECORATIONS = ['', '', '', ' (Official Video)', ' [Official Audio]', ' (Lyrics)', ' [LYRICS]',
+               ' (feat. Someone)', ' ft. Other', ' featuring Guest', ' (Live) [HD]', ' (Remastered 2011)',
+               ' (Lyrics (Official) Video)', '  ', ' | Topic', ' <3', ' ' + 'x' * 220]
+
+def corpus(count, seed=1):
+    rng = random.Random(seed)
+    artists = [' '.join(rng.sample(WORDS, rng.randint(1, 3))) for _ in range(max(1, count // 20))]
+    titles = []
+    pairs = []
+    for _ in range(count):
+        title = ' '.join(rng.sample(WORDS, rng.randint(1, 4))) + rng.choice(DECORATIONS)
+        titles.append(title)
+        pairs.append((rng.choice(artists) + rng.choice(['', '', ' - Topic', ' ']), title))
+    titles.extend(['', ' ', '<>', 'Official', 'lyrics', '(Official'])
+    pairs.extend([('', 'x'), ('x', ''), ('<>', 'x'), (None, 'x'), ('a', '?')])
+    return titles, pairs
+
+def check(titles, pairs):
+    for value in titles + [p[0] for p in pairs]:
+        assert normalize.clean_metadata_value(value) == legacy_clean_metadata_value(value), value
+    for title in titles:
+        assert normalize.clean_metadata_value(normalize.clean_video_title(title)) == legacy_clean_video_title(title), title
+    for artist, title in pairs:
+        assert normalize.normalize_filename(artist, title) == legacy_normalize_filename(artist, title), (artist, title)
+
+def timed(label, func, count):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed:8.3f} s   {elapsed * 1e6 / count:8.3f} s per million strings")
+    return elapsed
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    titles, pairs = corpus(count)
+    check(titles, pairs)
+    print(f"Outputs identical on {len(titles)} titles and {len(pairs)} artist/title pairs\n")
+
+    results = {}
+    results['titles legacy'] = timed('video titles, legacy', lambda: [legacy_clean_video_title(t) for t in titles], len(titles))
+    results['titles new'] = timed('video titles, precompiled', lambda: [normalize.clean_metadata_value(normalize.clean_video_title(t)) for t in titles], len(titles))
+    results['keys legacy'] = timed('duplicate keys, legacy', lambda: [legacy_normalize_filename(a, t) for a, t in pairs], len(pairs))
+    results['keys new'] = timed('duplicate keys, precompiled', lambda: [normalize.normalize_filename(a, t) for a, t in pairs], len(pairs))
+    artists = [a for a, _ in pairs]
+    results['artists legacy'] = timed('artist values, legacy', lambda: [legacy_clean_metadata_value(a) for a in artists], len(artists))
+    results['artists new'] = timed('artist values, precompiled', lambda: [normalize.clean_metadata_value(a) for a in artists], len(artists))
+
+    print()
+    print(f"video titles speedup:   {results['titles legacy'] / results['titles new']:.1f}x")
+    print(f"duplicate keys speedup: {results['keys legacy'] / results['keys new']:.1f}x")
+    print(f"artist values speedup:  {results['artists legacy'] / results['artists new']:.1f}x")
+
+if __name__ == '__main__':
+    main()
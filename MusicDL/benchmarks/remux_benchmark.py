@@ -0,0 +1,99 @@
+"""CPU time saved per track by the stream-copy fast path in downloader.remux.
+
+Run from the MusicDL directory:  python benchmarks/remux_benchmark.py [seconds]
+
+Synthetic sources shaped like YouTube's audio streams (Opus in WebM, AAC in M4A) are
+generated with ffmpeg, then each target is produced twice: re-encoded the way
+FFmpegExtractAudio does it at 192k, and stream-copied. ffmpeg's user+system CPU time
+is measured with getrusage. Finally RemuxOrExtractAudioPP itself is run on every
+source for every target, and the codec of its output is checked.
+"""
+import os
+import sys
+import shutil
+import resource
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from yt_dlp import YoutubeDL
+from downloader.remux import COPYABLE_CODECS, RemuxOrExtractAudioPP
+
+SOURCES = {
+    # name: (codec, extension, ffmpeg encoder options)
+    'opus': ('opus', 'webm', ['-c:a', 'libopus', '-b:a', '160k']),
+    'aac': ('aac', 'm4a', ['-c:a', 'aac', '-b:a', '128k']),
+}
+# Encoder FFmpegExtractAudio would use for each target at preferredquality 192
+TRANSCODE = {
+    'opus': ('opus', ['-c:a', 'libopus', '-b:a', '192k']),
+    'ogg': ('ogg', ['-c:a', 'libvorbis', '-b:a', '192k']),
+    'm4a': ('m4a', ['-c:a', 'aac', '-b:a', '192k']),
+    'aac': ('aac', ['-c:a', 'aac', '-b:a', '192k']),
+}
+
+# Codec the postprocessor must produce when it cannot copy the source
+ENCODED_CODEC = {'opus': 'opus', 'ogg': 'vorbis', 'm4a': 'aac', 'aac': 'aac', 'mp3': 'mp3'}
+
+def ffmpeg_cpu_seconds(args):
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    subprocess.run(['ffmpeg', '-v', 'error', '-y'] + args, check=True)
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+
+def check_postprocessor(workdir, sources):
+    """Run RemuxOrExtractAudioPP on each source for each target; returns the number of failures"""
+    ydl = YoutubeDL({'quiet': True, 'no_warnings': True})
+    failures = 0
+    print(f"\n{'source':<8}{'target':<8}{'output':<16}{'codec':<10}")
+    for name, (codec, ext, source) in sources.items():
+        for target, expected_encode in ENCODED_CODEC.items():
+            work = os.path.join(workdir, f'pp-{name}.{ext}')
+            shutil.copy(source, work)
+            expected = codec if codec in COPYABLE_CODECS.get(target, ()) else expected_encode
+            pp = RemuxOrExtractAudioPP(ydl, preferredcodec=target, preferredquality='192')
+            try:
+                _, info = pp.run({'id': name, 'title': name, 'filepath': work, 'ext': ext})
+                output = info['filepath']
+                got = pp.get_audio_codec(output)
+            except Exception as e:
+                output, got = '-', f'{type(e).__name__}: {e}'
+            ok = got == expected
+            failures += not ok
+            print(f"{name:<8}{target:<8}{os.path.basename(output):<16}{got:<10}{'' if ok else f'FAIL (expected {expected})'}")
+            for leftover in os.listdir(workdir):
+                if leftover.startswith('pp-'):
+                    os.remove(os.path.join(workdir, leftover))
+    return failures
+
+def main():
+    if not shutil.which('ffmpeg'):
+        sys.exit('ffmpeg is required for this benchmark')
+    seconds = int(sys.argv[1]) if len(sys.argv) > 1 else 240
+    workdir = tempfile.mkdtemp(prefix='musicdl-remux-')
+    try:
+        sources = {}
+        for name, (codec, ext, encoder) in SOURCES.items():
+            source = os.path.join(workdir, f'source-{name}.{ext}')
+            ffmpeg_cpu_seconds(['-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+                                '-f', 'lavfi', '-i', f'anoisesrc=duration={seconds}:amplitude=0.1',
+                                '-filter_complex', 'amix=inputs=2', '-ac', '2'] + encoder + [source])
+            sources[name] = (codec, ext, source)
+        print(f"{seconds} s synthetic tracks\n")
+        print(f"{'source':<8}{'target':<8}{'transcode CPU s':>17}{'copy CPU s':>12}{'saved per track':>17}")
+        for name, (codec, ext, source) in sources.items():
+            for target, (out_ext, transcode) in TRANSCODE.items():
+                if codec not in COPYABLE_CODECS.get(target, ()):
+                    continue
+                out = os.path.join(workdir, f'out.{out_ext}')
+                transcoded = ffmpeg_cpu_seconds(['-i', source, '-vn'] + transcode + [out])
+                copied = ffmpeg_cpu_seconds(['-i', source, '-vn', '-c:a', 'copy'] + (['-f', 'adts'] if target == 'aac' else []) + [out])
+                print(f"{name:<8}{target:<8}{transcoded:>17.2f}{copied:>12.2f}{transcoded - copied:>17.2f}")
+        if check_postprocessor(workdir, sources):
+            sys.exit('RemuxOrExtractAudioPP produced the wrong codec')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Exercise downloader.spotify_client against a local fake Spotify API.
+
+Run from the MusicDL directory:  python benchmarks/spotify_rate_limit_check.py [threads] [calls]
+
+The fake server issues client-credentials tokens and answers /v1/tracks, but only
+allows SERVER_LIMIT requests per second; beyond that it answers 429 with a
+Retry-After header, like the real API. Every call must succeed, and the counters
+show how many requests were throttled.
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from downloader.spotify_client import create_spotify_client, RateLimitedSession, TokenBucket
+
+SERVER_LIMIT = 15
+RETRY_AFTER = 1
+
+class FakeSpotify(BaseHTTPRequestHandler):
+    recent = deque()
+    lock = threading.Lock()
+    token_requests = 0
+    throttled = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.lock:
+            FakeSpotify.token_requests += 1
+        self._json(200, {'access_token': 'fake', 'token_type': 'Bearer', 'expires_in': 3600})
+
+    def do_GET(self):
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and now - self.recent[0] > 1:
+                self.recent.popleft()
+            limited = len(self.recent) >= SERVER_LIMIT
+            if limited:
+                FakeSpotify.throttled += 1
+            else:
+                self.recent.append(now)
+        if limited:
+            self._json(429, {'error': {'status': 429, 'message': 'API rate limit exceeded'}}, {'Retry-After': str(RETRY_AFTER)})
+            return
+        ids = parse_qs(urlparse(self.path).query).get('ids', [''])[0].split(',')
+        self._json(200, {'tracks': [{'id': i, 'name': f'Track {i}'} for i in ids]})
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    calls = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeSpotify)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    token_cache = os.path.join(tempfile.mkdtemp(prefix='musicdl-spotify-'), 'token.json')
+    try:
+        session = RateLimitedSession(TokenBucket(rate=20, burst=20))
+        sp = create_spotify_client('id', 'secret', session=session, api_prefix=f'{base}/v1/',
+                                   token_url=f'{base}/api/token', token_cache_path=token_cache)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(lambda n: sp.tracks([str(n)]), range(calls)))
+        elapsed = time.perf_counter() - start
+        ok = sum(1 for r in results if r['tracks'][0]['id'])
+        print(f"{ok}/{calls} calls succeeded in {elapsed:.1f}s with {threads} threads")
+        print(f"client: {session.stats()}, final rate {session.bucket.rate:.1f}/s")
+        print(f"server: {FakeSpotify.token_requests} token requests, {FakeSpotify.throttled} answered 429")
+    finally:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import os
+import io
+import hashlib
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', 'cache', 'covers')
+CACHE_MAX_BYTES = 200 * 1024 * 1024
+# Covers are embedded at most this size; Spotify's largest image is 640x640, YouTube thumbnails up to 1280x720
+EMBED_SIZE = 600
+JPEG_QUALITY = 90
+TIMEOUT = (5, 15)  # connect, read
+
+class CoverArtFetcher:
+    """Fetch cover images once, over pooled connections, cached on disk as embed-ready JPEG.
+
+    Concurrent requests for the same URL (tracks of one album) share one download.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, embed_size=EMBED_SIZE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.embed_size = embed_size
+        os.makedirs(cache_dir, exist_ok=True)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.lock = threading.Lock()
+        self.url_locks = {}
+        self.cache_bytes = None
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.jpg')
+
+    def _prepare(self, data):
+        """Resize to the embed size and re-encode as JPEG; keep the original if it can't be decoded"""
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                img = img.convert('RGB')
+                img.thumbnail((self.embed_size, self.embed_size), Image.LANCZOS)
+                out = io.BytesIO()
+                img.save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+                return out.getvalue()
+        except Exception as e:
+            logger.warning(f"Could not re-encode cover art, embedding original: {e}")
+            return data
+
+    def _url_lock(self, url):
+        with self.lock:
+            return self.url_locks.setdefault(url, threading.Lock())
+
+    def _evict(self, added):
+        with self.lock:
+            if self.cache_bytes is None:
+                self.cache_bytes = sum(e.stat().st_size for e in os.scandir(self.cache_dir) if e.is_file())
+            else:
+                self.cache_bytes += added
+            if self.cache_bytes <= self.max_bytes:
+                return
+            # Least recently used first; hits refresh the mtime
+            entries = sorted((e for e in os.scandir(self.cache_dir) if e.is_file()), key=lambda e: e.stat().st_mtime)
+            for entry in entries:
+                if self.cache_bytes <= self.max_bytes * 0.9:
+                    break
+                try:
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                    self.cache_bytes -= size
+                except OSError:
+                    pass
+
+    def get(self, url):
+        """Embed-ready JPEG bytes for an image URL, or None if it can't be fetched"""
+        if not url:
+            return None
+        path = self._path(url)
+        with self._url_lock(url):
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.utime(path)
+                return data
+            except OSError:
+                pass
+            try:
+                resp = self.session.get(url, timeout=TIMEOUT)
+            except requests.RequestException as e:
+                logger.warning(f"Failed to download cover art: {e}")
+                return None
+            if resp.status_code != 200:
+                logger.warning(f"Failed to download cover art: HTTP {resp.status_code}")
+                return None
+            data = self._prepare(resp.content)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"Could not cache cover art: {e}")
+                return data
+        with self.lock:
+            self.url_locks.pop(url, None)
+        self._evict(len(data))
+        return data
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+def get_cover_art(url):
+    """Shared process-wide cover art fetcher; returns JPEG bytes or None"""
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = CoverArtFetcher()
+    return _fetcher.get(url)
@@ -0,0 +1,98 @@
+import os
+import time
+import threading
+import logging
+from yt_dlp.postprocessor import PostProcessor
+
+logger = logging.getLogger(__name__)
+
+# status_callback event sent once a track's final file is in place
+FILE_READY = 'file_ready'
+
+class TrackReadyPP(PostProcessor):
+    """Runs after yt-dlp has moved a track to its final path, once per track.
+
+    Register with when='after_move'; by then every postprocessor (ffmpeg included)
+    has finished, so info['filepath'] is the complete final file.
+    """
+    def __init__(self, on_ready):
+        super().__init__(None)
+        self.on_ready = on_ready
+
+    def run(self, info):
+        self.on_ready(info)
+        return [], info
+
+def file_ready_event(filepath, metadata=None):
+    """status_callback payload announcing a finished file"""
+    return {'status': FILE_READY, 'filepath': filepath, 'metadata': metadata or {}}
+
+class JobManifest:
+    """Intermediate files created by one download job, removed when the job ends.
+
+    Only paths yt-dlp reported for this job are touched, so jobs sharing an output
+    folder never delete each other's files. Files that were already there when the
+    job started (yt-dlp reuses them instead of downloading) are never tracked.
+    Final files are marked with keep().
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.paths = set()
+        self.kept = set()
+        self.preexisting = set()
+
+    def _existed_before(self, path):
+        try:
+            return os.stat(path).st_mtime < self.started
+        except OSError:
+            return False
+
+    def track(self, path):
+        if not path:
+            return
+        with self.lock:
+            if path in self.paths or path in self.preexisting:
+                return
+        # Decided on first sight: a library file this job later retags stays protected
+        existed = self._existed_before(path)
+        with self.lock:
+            (self.preexisting if existed else self.paths).add(path)
+
+    def keep(self, path):
+        if path:
+            with self.lock:
+                self.kept.add(path)
+
+    def progress_hook(self, d):
+        if d.get('status') == 'finished' and d.get('downloaded_bytes') is None and d.get('elapsed') is None:
+            # "has already been downloaded": yt-dlp reused a file this job did not create
+            with self.lock:
+                self.preexisting.add(d.get('filename'))
+            return
+        # Source download, its .part file and yt-dlp's resume metadata
+        for path in (d.get('filename'), d.get('tmpfilename')):
+            if path:
+                self.track(path)
+                self.track(path + '.part')
+                self.track(path + '.ytdl')
+
+    def postprocessor_hook(self, d):
+        # The file each postprocessor starts from is intermediate unless it ends up kept
+        self.track((d.get('info_dict') or {}).get('filepath'))
+
+    def cleanup(self):
+        """Remove every tracked file that still exists and was not kept; returns the removed paths"""
+        with self.lock:
+            leftovers = self.paths - self.kept - self.preexisting
+            self.paths.clear()
+        removed = []
+        for path in leftovers:
+            try:
+                os.remove(path)
+                removed.append(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove intermediate file {path}: {e}")
+        return removed
@@ -0,0 +1,168 @@
+import os
+import hashlib
+import sqlite3
+import threading
+import logging
+from mutagen import File as MutagenFile
+from downloader.normalize import normalize_filename
+
+logger = logging.getLogger(__name__)
+
+# Index databases live next to the app, not in the library folder, so cleanup sweeps never touch them
+INDEX_DIR = os.path.join(os.path.dirname(__file__), '..', 'cache')
+
+AUDIO_EXTS = ('mp3', 'mp4', 'm4a', 'flac', 'wav', 'opus', 'ogg', 'aac')
+
+def duplicate_key(artist, title):
+    """Normalized 'artist - title' key used for duplicate detection"""
+    return normalize_filename(artist, title)
+
+def _first_tag(tags, name):
+    value = tags.get(name) if tags else None
+    if isinstance(value, list):
+        value = value[0] if value else None
+    return str(value) if value else None
+
+def keys_for_file(path, extra_metadata=None):
+    """All duplicate keys a library file answers to: its filename and its tags"""
+    name = os.path.splitext(os.path.basename(path))[0]
+    keys = set()
+    if ' - ' in name:
+        parts = name.split(' - ')
+        keys.add(duplicate_key(parts[0], parts[1]))
+    try:
+        audio = MutagenFile(path, easy=True)
+        tags = audio.tags if audio is not None else None
+        keys.add(duplicate_key(_first_tag(tags, 'artist'), _first_tag(tags, 'title') or name))
+    except Exception as e:
+        logger.debug(f"Could not read tags from {path}: {e}")
+    if extra_metadata:
+        keys.add(duplicate_key(extra_metadata.get('artist'), extra_metadata.get('title')))
+    keys.discard(None)
+    return keys
+
+class LibraryIndex:
+    """Persistent normalized-key index of one download directory.
+
+    The directory is scanned once per process; only files whose size or mtime
+    changed since the last run are re-read. Lookups are dictionary hits.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS files (
+            name TEXT PRIMARY KEY,
+            mtime REAL NOT NULL,
+            size INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS file_keys (
+            name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            PRIMARY KEY (name, key)
+        );
+    """
+
+    def __init__(self, download_dir, db_path=None):
+        self.download_dir = os.path.abspath(download_dir)
+        if db_path is None:
+            digest = hashlib.sha1(self.download_dir.encode('utf-8')).hexdigest()[:16]
+            db_path = os.path.join(INDEX_DIR, f'library-{digest}.sqlite3')
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.executescript(self.SCHEMA)
+        self.by_key = {}  # (key, ext) -> set of file names
+        self.file_keys = {}  # file name -> set of keys
+        self.refresh()
+
+    def _add_keys(self, name, keys):
+        ext = os.path.splitext(name)[1].lstrip('.').lower()
+        self.file_keys[name] = keys
+        for key in keys:
+            self.by_key.setdefault((key, ext), set()).add(name)
+
+    def _drop(self, name):
+        ext = os.path.splitext(name)[1].lstrip('.').lower()
+        for key in self.file_keys.pop(name, ()):
+            names = self.by_key.get((key, ext))
+            if names:
+                names.discard(name)
+                if not names:
+                    del self.by_key[(key, ext)]
+        self.db.execute('DELETE FROM files WHERE name = ?', (name,))
+        self.db.execute('DELETE FROM file_keys WHERE name = ?', (name,))
+
+    def _store(self, name, stat, keys):
+        self.db.execute('INSERT OR REPLACE INTO files (name, mtime, size) VALUES (?, ?, ?)',
+                        (name, stat.st_mtime, stat.st_size))
+        self.db.execute('DELETE FROM file_keys WHERE name = ?', (name,))
+        self.db.executemany('INSERT INTO file_keys (name, key) VALUES (?, ?)', [(name, k) for k in keys])
+
+    def refresh(self):
+        """Sync the index with the directory, re-reading only new or changed files"""
+        with self.lock:
+            stored = {name: (mtime, size) for name, mtime, size in self.db.execute('SELECT name, mtime, size FROM files')}
+            stored_keys = {}
+            for name, key in self.db.execute('SELECT name, key FROM file_keys'):
+                stored_keys.setdefault(name, set()).add(key)
+            self.by_key.clear()
+            self.file_keys.clear()
+            seen = set()
+            changed = 0
+            if os.path.isdir(self.download_dir):
+                with os.scandir(self.download_dir) as it:
+                    for entry in it:
+                        if not entry.is_file() or not entry.name.lower().endswith(AUDIO_EXTS):
+                            continue
+                        seen.add(entry.name)
+                        stat = entry.stat()
+                        if stored.get(entry.name) == (stat.st_mtime, stat.st_size):
+                            self._add_keys(entry.name, stored_keys.get(entry.name, set()))
+                            continue
+                        keys = keys_for_file(entry.path)
+                        self._store(entry.name, stat, keys)
+                        self._add_keys(entry.name, keys)
+                        changed += 1
+            for name in set(stored) - seen:
+                self._drop(name)
+            self.db.commit()
+            logger.info(f"Library index for {self.download_dir}: {len(seen)} files, {changed} re-read")
+
+    def add(self, path, metadata=None):
+        """Record a file that was just written to the directory"""
+        name = os.path.basename(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        keys = keys_for_file(path, metadata)
+        with self.lock:
+            self._drop(name)
+            self._store(name, stat, keys)
+            self._add_keys(name, keys)
+            self.db.commit()
+
+    def contains(self, artist, title, audio_format):
+        """True if a file with this format already answers to artist/title"""
+        key = duplicate_key(artist, title)
+        if not key:
+            return False
+        with self.lock:
+            for name in list(self.by_key.get((key, audio_format.lower()), ())):
+                if os.path.exists(os.path.join(self.download_dir, name)):
+                    return True
+                # Deleted behind our back; forget it
+                self._drop(name)
+                self.db.commit()
+        return False
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_library_index(download_dir):
+    """Process-wide index for a download directory, built on first use"""
+    path = os.path.abspath(download_dir)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = LibraryIndex(path)
+        return index
@@ -0,0 +1,95 @@
+import os
+import time
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'cache', 'matches.sqlite3')
+# Confident matches are trusted for a month; doubtful ones are searched again the next day
+MATCH_TTL = 30 * 24 * 3600
+LOW_CONFIDENCE_TTL = 24 * 3600
+LOW_CONFIDENCE = 0.5
+
+class MatchCache:
+    """Persistent Spotify track -> YouTube video matches, keyed by track ID and ISRC."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS matches (
+            track_id TEXT PRIMARY KEY,
+            isrc TEXT,
+            video_id TEXT NOT NULL,
+            confidence REAL NOT NULL,
+            resolved_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS matches_isrc ON matches (isrc);
+    """
+
+    def __init__(self, db_path=DB_PATH, ttl=MATCH_TTL, low_confidence_ttl=LOW_CONFIDENCE_TTL):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.ttl = ttl
+        self.low_confidence_ttl = low_confidence_ttl
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.executescript(self.SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def _fresh(self, row, now):
+        ttl = self.ttl if row['confidence'] >= LOW_CONFIDENCE else self.low_confidence_ttl
+        return now - row['resolved_at'] < ttl
+
+    def get(self, track_id, isrc=None):
+        """Cached match {'video_id', 'confidence', 'resolved_at'} if one is still fresh, else None.
+
+        The same recording released on several albums shares an ISRC, so a match for
+        any of its track IDs is reused.
+        """
+        if not track_id and not isrc:
+            return None
+        with self.lock:
+            cursor = self.db.execute(
+                'SELECT video_id, confidence, resolved_at FROM matches WHERE track_id = ? OR (isrc IS NOT NULL AND isrc = ?) '
+                'ORDER BY track_id = ? DESC, confidence DESC LIMIT 1',
+                (track_id, isrc, track_id))
+            found = cursor.fetchone()
+            if found is not None:
+                row = dict(zip(('video_id', 'confidence', 'resolved_at'), found))
+                if self._fresh(row, time.time()):
+                    self.hits += 1
+                    return row
+            self.misses += 1
+            return None
+
+    def put(self, track_id, isrc, video_id, confidence):
+        """Record (or revalidate) the chosen video for a track"""
+        if not track_id or not video_id:
+            return
+        with self.lock:
+            self.db.execute(
+                'INSERT OR REPLACE INTO matches (track_id, isrc, video_id, confidence, resolved_at) VALUES (?, ?, ?, ?, ?)',
+                (track_id, isrc, video_id, confidence, time.time()))
+            self.db.commit()
+
+    def delete(self, track_id, isrc=None):
+        """Forget a match that turned out to be unusable (removed, region-locked or age-gated video).
+
+        Matches shared through the ISRC go too, so get() cannot hand the same video back.
+        """
+        if not track_id and not isrc:
+            return
+        with self.lock:
+            self.db.execute('DELETE FROM matches WHERE track_id = ? OR (isrc IS NOT NULL AND isrc = ?)', (track_id, isrc))
+            self.db.commit()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_match_cache():
+    """Process-wide match cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MatchCache()
+        return _cache
@@ -0,0 +1,71 @@
+import re
+
+# Characters that break filenames or cause near-duplicate metadata
+_UNSAFE_CHARS = re.compile(r'[<>:"/\\|?*]')
+MAX_VALUE_LENGTH = 200
+
+# YouTube title suffixes, applied in this order
+_TITLE_NOISE = [
+    re.compile(r'\s*\(Official.*?\)', re.IGNORECASE),
+    re.compile(r'\s*\[Official.*?\]', re.IGNORECASE),
+    re.compile(r'\s*\(Lyrics.*?\)', re.IGNORECASE),
+    re.compile(r'\s*\[Lyrics.*?\]', re.IGNORECASE),
+]
+# Every suffix pattern needs one of these words, so titles without them skip the four passes
+_TITLE_NOISE_HINT = re.compile(r'official|lyrics', re.IGNORECASE)
+
+# Common patterns in music video descriptions, tried in this order
+DESCRIPTION_ARTIST_PATTERNS = [
+    re.compile(r'Artist:\s*([^\n]+)', re.IGNORECASE),
+    re.compile(r'Performed by:\s*([^\n]+)', re.IGNORECASE),
+    re.compile(r'by\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)', re.IGNORECASE),
+]
+
+_PARENTHESES = re.compile(r'\([^)]*\)')
+_BRACKETS = re.compile(r'\[[^\]]*\]')
+_FEATURING = re.compile(r'feat\.?|ft\.?|featuring', re.IGNORECASE)
+_NON_ALNUM_SPACE = re.compile(r'[^a-zA-Z0-9\s]+')
+_NON_ALNUM = re.compile(r'[^a-zA-Z0-9]')
+
+def clean_metadata_value(value):
+    """Clean and validate metadata values to prevent duplicates and ensure accuracy"""
+    if not value:
+        return None
+    # Remove extra whitespace and problematic characters, limit length
+    cleaned = _UNSAFE_CHARS.sub('', str(value).strip())[:MAX_VALUE_LENGTH]
+    return cleaned if cleaned else None
+
+def clean_video_title(title):
+    """Strip '(Official ...)' / '[Lyrics ...]' style suffixes from a YouTube title"""
+    if _TITLE_NOISE_HINT.search(title):
+        for pattern in _TITLE_NOISE:
+            title = pattern.sub('', title)
+    return title
+
+def normalize_filename(artist, title):
+    """Improved filename normalization for better duplicate detection"""
+    if not artist or not title:
+        return None
+
+    # Clean and normalize both artist and title
+    artist_clean = clean_metadata_value(artist)
+    title_clean = clean_metadata_value(title)
+
+    if not artist_clean or not title_clean:
+        return None
+
+    base = f"{artist_clean} - {title_clean}"
+    # Remove common patterns that don't affect uniqueness; skip passes that cannot match
+    if '(' in base:
+        base = _PARENTHESES.sub('', base)
+    if '[' in base:
+        base = _BRACKETS.sub('', base)
+    if 'f' in base or 'F' in base:
+        base = _FEATURING.sub('', base)
+    base = _NON_ALNUM_SPACE.sub('', base)  # Keep only alphanumeric and spaces
+    # Normalize whitespace; str.split() and \s both use str.isspace(), so this equals sub(r'\s+', ' ').strip()
+    return ' '.join(base.split()).lower()
+
+def alnum_key(value):
+    """Lowercase value with everything but ASCII letters and digits removed"""
+    return _NON_ALNUM.sub('', value.lower())
@@ -0,0 +1,68 @@
+from yt_dlp.postprocessor import FFmpegExtractAudioPP
+from yt_dlp.utils import replace_extension
+
+# yt-dlp format selectors that prefer a source stream whose codec already fits the target
+FORMAT_PREFERENCE = {
+    'opus': 'bestaudio[acodec=opus]/bestaudio/best',
+    'ogg': 'bestaudio[acodec=opus]/bestaudio[acodec=vorbis]/bestaudio/best',
+    'm4a': 'bestaudio[acodec^=mp4a]/bestaudio/best',
+    'aac': 'bestaudio[acodec^=mp4a]/bestaudio/best',
+    'mp3': 'bestaudio[acodec=mp3]/bestaudio/best',
+}
+
+# Source codecs (as reported by ffprobe) that are copied into the target without re-encoding
+COPYABLE_CODECS = {
+    'opus': ('opus',),
+    'ogg': ('opus', 'vorbis'),
+    'm4a': ('aac',),
+    'aac': ('aac',),
+    'mp3': ('mp3',),
+    'flac': ('flac',),
+}
+
+def audio_format_selector(target_format):
+    """yt-dlp 'format' option for an audio download converted to target_format"""
+    return FORMAT_PREFERENCE.get(target_format, 'bestaudio/best')
+
+class RemuxOrExtractAudioPP(FFmpegExtractAudioPP):
+    """FFmpegExtractAudio that stream-copies whenever the source codec already fits the target.
+
+    yt-dlp already copies same-codec sources for opus, m4a/aac, mp3 and flac. It has no
+    'ogg' codec at all (ACODECS has no such key), so .ogg targets are handled here:
+    Opus or Vorbis sources are copied into the Ogg container and anything else is
+    encoded to Vorbis.
+    """
+
+    def __init__(self, downloader=None, preferredcodec=None, preferredquality=None, nopostoverwrites=False):
+        codec = 'vorbis' if preferredcodec == 'ogg' else preferredcodec
+        super().__init__(downloader, codec, preferredquality, nopostoverwrites)
+        self.target_format = preferredcodec
+        # How the last run wrote its output: True re-encoded, False stream-copied, None ran no ffmpeg
+        self.encoded = None
+
+    @classmethod
+    def pp_key(cls):
+        # Same name as FFmpegExtractAudio, so postprocessor_args, hooks and metrics treat both alike
+        return 'ExtractAudio'
+
+    def run_ffmpeg(self, path, out_path, codec, more_opts):
+        self.encoded = codec != 'copy'
+        return super().run_ffmpeg(path, out_path, codec, more_opts)
+
+    def run(self, info):
+        self.encoded = None
+        path = info['filepath']
+        if self.target_format != 'ogg':
+            return super().run(info)
+        codec = self.get_audio_codec(path)
+        if codec not in COPYABLE_CODECS['ogg']:
+            return super().run(info)
+        new_path = replace_extension(path, 'ogg')
+        if new_path == path:
+            return [], info
+        self.to_screen(f'Remuxing {codec} audio into "{new_path}"')
+        # FFmpegExtractAudio.run_ffmpeg adds -vn and -acodec itself
+        self.run_ffmpeg(path, new_path, 'copy', [])
+        info['filepath'] = new_path
+        info['ext'] = 'ogg'
+        return [path], info
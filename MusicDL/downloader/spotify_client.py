@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+import spotipy
+from spotipy.oauth2 import SpotifyClientCredentials
+from spotipy.cache_handler import CacheFileHandler
+
+logger = logging.getLogger(__name__)
+
+CREDENTIALS_PATH = os.path.join(os.path.dirname(__file__), '..', 'config', 'spotify_credentials.json')
+# Client-credentials tokens last an hour; kept on disk so later runs skip the token request
+TOKEN_CACHE_PATH = os.path.join(os.path.dirname(__file__), '..', 'cache', 'spotify_token.json')
+# Steady request rate and burst shared by every job in the process; halved on each 429
+REQUESTS_PER_SECOND = 10
+BURST = 20
+MIN_REQUESTS_PER_SECOND = 1
+MAX_429_RETRIES = 5
+MAX_RETRY_AFTER = 60
+TIMEOUT = 10
+
+class TokenBucket:
+    """Thread-safe token bucket; pause() stops every caller until a Retry-After has passed."""
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, burst=BURST, min_rate=MIN_REQUESTS_PER_SECOND):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent; returns the seconds spent waiting"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                # updated is in the future while paused, so nothing refills until the pause ends
+                if now >= self.updated:
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return waited
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    wait = self.updated - now
+            time.sleep(wait)
+            waited += wait
+
+    def pause(self, seconds):
+        """Hold all requests for seconds and slow the steady rate down"""
+        with self.lock:
+            self.updated = max(self.updated, time.monotonic() + seconds)
+            self.tokens = 0
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def recover(self):
+        """Creep back towards the configured rate after a successful request"""
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+def retry_after(response, attempt):
+    """Seconds to wait after a 429: the Retry-After header, else exponential backoff"""
+    try:
+        delay = float(response.headers.get('Retry-After', ''))
+    except ValueError:
+        delay = 2 ** attempt
+    return min(MAX_RETRY_AFTER, max(0.0, delay))
+
+class RateLimitedSession(requests.Session):
+    """requests.Session that paces calls through a TokenBucket and retries 429 responses.
+
+    Counters (requests, rate_limited, and waited summed over threads) are kept for the whole process.
+    """
+
+    def __init__(self, bucket=None, max_retries=MAX_429_RETRIES):
+        super().__init__()
+        self.bucket = bucket or TokenBucket()
+        self.max_retries = max_retries
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        self.stats_lock = threading.Lock()
+        self.requests = 0
+        self.rate_limited = 0
+        self.waited = 0.0
+
+    def request(self, method, url, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            waited = self.bucket.acquire()
+            response = super().request(method, url, *args, **kwargs)
+            with self.stats_lock:
+                self.requests += 1
+                self.waited += waited
+                if response.status_code == 429:
+                    self.rate_limited += 1
+            if response.status_code != 429:
+                self.bucket.recover()
+                return response
+            if attempt == self.max_retries:
+                break
+            delay = retry_after(response, attempt)
+            logger.warning(f"Spotify rate limit hit, retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+            self.bucket.pause(delay)
+        return response
+
+    def stats(self):
+        with self.stats_lock:
+            return {'requests': self.requests, 'rate_limited': self.rate_limited, 'waited': round(self.waited, 2)}
+
+class SharedClientCredentials(SpotifyClientCredentials):
+    """Client credentials whose token is fetched by one thread while the others wait for it"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.token_lock = threading.Lock()
+
+    def get_access_token(self, *args, **kwargs):
+        with self.token_lock:
+            return super().get_access_token(*args, **kwargs)
+
+def create_spotify_client(client_id, client_secret, session=None, api_prefix=None, token_url=None,
+                          token_cache_path=TOKEN_CACHE_PATH):
+    """spotipy client whose API calls go through a RateLimitedSession.
+
+    api_prefix and token_url point the client at another server (a local fake in tests).
+    """
+    session = session or RateLimitedSession()
+    os.makedirs(os.path.dirname(token_cache_path), exist_ok=True)
+    auth = SharedClientCredentials(
+        client_id=client_id,
+        client_secret=client_secret,
+        cache_handler=CacheFileHandler(cache_path=token_cache_path),
+    )
+    if token_url:
+        auth.OAUTH_TOKEN_URL = token_url
+    # retries are handled by the session; spotipy's own urllib3 retries are not mounted on a passed session
+    sp = spotipy.Spotify(auth_manager=auth, requests_session=session, requests_timeout=TIMEOUT)
+    if api_prefix:
+        sp.prefix = api_prefix
+    return sp
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_spotify_client():
+    """Process-wide Spotify client, built once from config/spotify_credentials.json"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            with open(CREDENTIALS_PATH, 'r') as f:
+                creds = json.load(f)
+            _client = create_spotify_client(creds['client_id'], creds['client_secret'])
+        return _client
+
+def spotify_stats():
+    """Request, 429 and pacing counters of the shared client (empty before first use)"""
+    with _client_lock:
+        return _client._session.stats() if _client is not None else {}
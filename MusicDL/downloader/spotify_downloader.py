@@ -1,26 +1,84 @@
-import os
-import json
-import requests
-from spotipy.oauth2 import SpotifyClientCredentials
-import spotipy
-from downloader.youtube_downloader import download_youtube, tag_audio_file, validate_metadata, clean_metadata_value
-from downloader.utils import search_youtube
-import time
+from downloader.youtube_downloader import download_youtube, validate_metadata, clean_metadata_value, file_exists
+from downloader.utils import search_youtube_match, ordered_prefetch
+from downloader.match_cache import get_match_cache, LOW_CONFIDENCE
+from downloader.cover_art import get_cover_art
+from downloader.spotify_client import get_spotify_client, spotify_stats
 import logging
 
 # Set up logging for metadata operations
 logger = logging.getLogger(__name__)
 
-def get_spotify_client():
-    cred_path = os.path.join(os.path.dirname(__file__), '..', 'config', 'spotify_credentials.json')
-    with open(cred_path, 'r') as f:
-        creds = json.load(f)
-    return spotipy.Spotify(auth_manager=SpotifyClientCredentials(
-        client_id=creds['client_id'],
-        client_secret=creds['client_secret']
-    ))
+# Tracks whose metadata and YouTube search are resolved at the same time, ahead of the downloads
+RESOLVE_WORKERS = 8
+# Most IDs the Spotify batch endpoints (sp.tracks) accept per call
+SPOTIFY_BATCH_SIZE = 50
+PLAYLIST_PAGE_SIZE = 100
+# Only the track fields extract_spotify_metadata and the YouTube match use
+PLAYLIST_FIELDS = ('items(track(id,name,artists(name),album(id,name,release_date,images),'
+                   'track_number,duration_ms,external_ids)),next,total')
 
-def extract_spotify_metadata(track):
+def album_metadata(album_info, album_cache=None):
+    """(album name, release year, cover art bytes) for a Spotify album object, computed once per album"""
+    key = album_info.get('id') or album_info.get('name')
+    if album_cache is not None and key in album_cache:
+        return album_cache[key]
+    album = clean_metadata_value(album_info.get('name', ''))
+    # Extract release date (allow blank)
+    date = ''
+    release_date = album_info.get('release_date')
+    if release_date:
+        # Extract year from date (format: YYYY-MM-DD or YYYY)
+        date = release_date[:4] if len(release_date) >= 4 else release_date
+    # Highest quality image (allow failure); also cached on disk by URL
+    cover_art = None
+    if album_info.get('images'):
+        cover_art = get_cover_art(album_info['images'][0]['url'])
+        if cover_art:
+            logger.info(f"Got cover art for album {album}")
+    result = (album, date, cover_art)
+    if album_cache is not None and key:
+        album_cache[key] = result
+    return result
+
+def album_tracks(sp, link):
+    """Full track objects of an album: one album call, then up to 50 tracks per sp.tracks call.
+
+    album_tracks() alone returns simplified tracks without album, ISRC or popularity data.
+    """
+    album = sp.album(link)
+    if not album:
+        return []
+    page = album['tracks']
+    ids = [t['id'] for t in page['items'] if t and t.get('id')]
+    while page.get('next'):
+        page = sp.next(page)
+        ids.extend(t['id'] for t in page['items'] if t and t.get('id'))
+    tracks = []
+    for start in range(0, len(ids), SPOTIFY_BATCH_SIZE):
+        tracks.extend(t for t in sp.tracks(ids[start:start + SPOTIFY_BATCH_SIZE])['tracks'] if t)
+    return tracks
+
+def playlist_tracks(sp, page, errors=None):
+    """Yield a playlist's tracks starting from its first page, fetching each next page only when
+    the previous one is used up, so memory stays at one page however long the playlist is.
+
+    A failed page request ends the playlist early; the exception is appended to errors.
+    """
+    while page:
+        for item in page['items']:
+            if item.get('track'):
+                yield item['track']
+        if not page.get('next'):
+            return
+        try:
+            page = sp.next(page)
+        except Exception as e:
+            logger.error(f"Failed to fetch the next playlist page, stopping here: {e}")
+            if errors is not None:
+                errors.append(e)
+            return
+
+def extract_spotify_metadata(track, album_cache=None):
     """Extract and validate metadata from Spotify track"""
     try:
         if not track:
@@ -53,17 +111,8 @@ def extract_spotify_metadata(track):
                     feat_artists = ', '.join(additional_artists)
                     title = f"{title} (feat. {feat_artists})"
         
-        # Extract album information (allow blank)
-        album_info = track.get('album', {})
-        album = clean_metadata_value(album_info.get('name', ''))
-        
-        # Extract release date (allow blank)
-        date = ''
-        if 'release_date' in album_info:
-            release_date = album_info['release_date']
-            if release_date:
-                # Extract year from date (format: YYYY-MM-DD or YYYY)
-                date = release_date[:4] if len(release_date) >= 4 else release_date
+        # Album name, release year and cover art are shared by every track of the album
+        album, date, cover_art = album_metadata(track.get('album') or {}, album_cache)
         
         # Extract genre (Spotify doesn't provide track-level genres, so we'll skip)
         genre = ''
@@ -73,21 +122,6 @@ def extract_spotify_metadata(track):
         if not isinstance(tracknumber, int) or tracknumber < 1:
             tracknumber = 1
         
-        # Fetch cover art (allow failure)
-        cover_art = None
-        if album_info.get('images'):
-            try:
-                # Use highest quality image
-                cover_url = album_info['images'][0]['url']
-                resp = requests.get(cover_url, timeout=10)
-                if resp.status_code == 200:
-                    cover_art = resp.content
-                    logger.info(f"Successfully downloaded cover art for {title}")
-                else:
-                    logger.warning(f"Failed to download cover art: HTTP {resp.status_code}")
-            except Exception as e:
-                logger.warning(f"Failed to download cover art: {e}")
-        
         # Create metadata dictionary
         metadata = {
             'title': title,
@@ -96,7 +130,6 @@ def extract_spotify_metadata(track):
             'date': date,
             'genre': genre,
             'tracknumber': tracknumber,
-            'cover_art': cover_art
         }
         
         # Validate the metadata (will use defaults if needed)
@@ -106,6 +139,8 @@ def extract_spotify_metadata(track):
             return {'title': title, 'artist': artist}
         
         logger.info(f"Extracted Spotify metadata: {validated_metadata}")
+        # Cover art is bytes; added after validation so it is not cleaned as text
+        validated_metadata['cover_art'] = cover_art
         return validated_metadata
         
     except Exception as e:
@@ -115,6 +150,8 @@ def extract_spotify_metadata(track):
 def download_spotify(link, mode, status_callback, download_dir=None, audio_format='mp3'):
     sp = get_spotify_client()
     tracks = []
+    track_count = None
+    page_errors = []
     
     try:
         if 'track' in link:
@@ -126,20 +163,17 @@ def download_spotify(link, mode, status_callback, download_dir=None, audio_forma
                 return False
 
         elif 'album' in link:
-            album = sp.album_tracks(link)
-            if album and 'items' in album:
-                tracks = album['items']
-            else:
+            tracks = album_tracks(sp, link)
+            if not tracks:
                 status_callback('Invalid Spotify album link')
                 return False
 
         elif 'playlist' in link:
-            results = sp.playlist_tracks(link, limit=100)
-            if results and 'items' in results:
-                tracks.extend([item['track'] for item in results['items'] if item.get('track')])
-                while results.get('next'):
-                    results = sp.next(results)
-                    tracks.extend([item['track'] for item in results['items'] if item.get('track')])
+            # Only the first page is fetched here; the rest stream in while earlier tracks download
+            first_page = sp.playlist_tracks(link, limit=PLAYLIST_PAGE_SIZE, fields=PLAYLIST_FIELDS)
+            if first_page and 'items' in first_page:
+                track_count = first_page.get('total') or 0
+                tracks = playlist_tracks(sp, first_page, page_errors)
             else:
                 status_callback('Invalid Spotify playlist link')
                 return False
@@ -147,75 +181,114 @@ def download_spotify(link, mode, status_callback, download_dir=None, audio_forma
             status_callback('Invalid Spotify link')
             return False
         
-        if not tracks:
+        if track_count is None:
+            track_count = len(tracks)
+        if not track_count:
             status_callback('No tracks found in Spotify link')
             return False
             
-        logger.info(f"Found {len(tracks)} tracks to download")
+        logger.info(f"Found {track_count} tracks to download")
         
     except Exception as e:
         logger.error(f"Failed to fetch Spotify tracks: {e}")
         status_callback(f'Spotify API error: {e}')
         return False
 
-    success_count = 0
-    for idx, t in enumerate(tracks, 1):
+    def resolve_track(idx, t):
         if not t:  # Sometimes 'None' can be in the playlist
-            logger.warning(f"Skipping None track at index {idx}")
-            continue
-        
+            return idx, None, None, False
         # Extract and validate metadata (will use defaults if extraction fails)
-        metadata = extract_spotify_metadata(t)
+        metadata = extract_spotify_metadata(t, album_cache)
         if not metadata:
             logger.warning(f"Using default metadata for track {idx}")
             metadata = {'title': f'Track {idx}', 'artist': 'Unknown Artist'}
+        # Tracks already in the library need no search
+        if download_dir and file_exists(download_dir, metadata['artist'], metadata['title'], audio_format):
+            return idx, metadata, None, True
+        # Tracks resolved on an earlier run skip the search
+        match = {'track_id': t.get('id'), 'isrc': (t.get('external_ids') or {}).get('isrc'),
+                 'duration_ms': t.get('duration_ms'), 'cached': True}
+        cached = match_cache.get(match['track_id'], match['isrc'])
+        if cached is not None:
+            return idx, metadata, dict(match, video_id=cached['video_id']), False
+        video_id, confidence = search_youtube_match(metadata['title'], metadata['artist'], match['duration_ms'])
+        if not video_id:
+            return idx, metadata, None, False
+        match_cache.put(match['track_id'], match['isrc'], video_id, confidence)
+        if confidence < LOW_CONFIDENCE:
+            logger.warning(f"Low-confidence YouTube match ({confidence}) for {metadata['artist']} - {metadata['title']}")
+        return idx, metadata, dict(match, video_id=video_id, cached=False), False
+
+    def resolve(numbered_track):
+        # Metadata (with cover art) and the YouTube search run ahead of the downloads on a pool;
+        # a failure (network error, search quota) fails only its own track
+        idx, t = numbered_track
+        try:
+            return resolve_track(idx, t) + (None,)
+        except Exception as e:
+            logger.error(f"Failed to resolve track {idx}: {e}")
+            name = (t or {}).get('name') or f'Track {idx}'
+            artist = ', '.join(a.get('name', '') for a in (t or {}).get('artists') or []) or 'Unknown Artist'
+            return idx, {'title': name, 'artist': artist}, None, False, e
+
+    match_cache = get_match_cache()
+    album_cache = {}
+    success_count = 0
+    processed = 0
+    for idx, metadata, match, exists, error in ordered_prefetch(resolve, enumerate(tracks, 1), workers=RESOLVE_WORKERS):
+        processed += 1
+        if error is not None:
+            status_callback(f"Failed track: {metadata['title']} by {metadata['artist']} ({error})")
+            continue
+        if metadata is None:
+            logger.warning(f"Skipping None track at index {idx}")
+            continue
         
         title = metadata['title']
         artist = metadata['artist']
         
+        if exists:
+            status_callback(f"Skipped (already exists): {artist} - {title}")
+            continue
+        
         # Duplicate check via callback
         if hasattr(status_callback, '__call__'):
             if status_callback(('check_duplicate', artist, title)):
                 logger.info(f"Skipping duplicate: {artist} - {title}")
                 continue
         
-        # Search YouTube for the track
-        query = f"{title} {artist} audio"
-        yt_url = search_youtube(query)
-        
-        if yt_url:
+        if match:
             status_callback(f"Downloading: {title} by {artist}")
-            success = download_youtube(yt_url, mode, status_callback, download_dir, audio_format, metadata)
+            success = download_youtube(f"https://www.youtube.com/watch?v={match['video_id']}", mode, status_callback,
+                                       download_dir, audio_format, metadata)
+            if not success:
+                # The video may have been removed, region-locked or age-gated; don't reuse it next time
+                match_cache.delete(match['track_id'], match['isrc'])
+            if not success and match['cached']:
+                # A fresh search may find a different, working upload
+                video_id, confidence = search_youtube_match(title, artist, match['duration_ms'])
+                if video_id and video_id != match['video_id']:
+                    match_cache.put(match['track_id'], match['isrc'], video_id, confidence)
+                    status_callback(f"Retrying with a new YouTube match: {title} by {artist}")
+                    success = download_youtube(f"https://www.youtube.com/watch?v={video_id}", mode, status_callback,
+                                               download_dir, audio_format, metadata)
+                    if not success:
+                        match_cache.delete(match['track_id'], match['isrc'])
             
             if success:
-                # Wait for file to be fully available before next track and tag only the correct file
-                if download_dir:
-                    expected_filename = f"{artist} - {title}.{audio_format}"
-                    file_path = os.path.join(download_dir, expected_filename)
-                    if os.path.exists(file_path):
-                        for _ in range(10):
-                            try:
-                                with open(file_path, 'ab') as f:
-                                    pass
-                                break
-                            except OSError:
-                                time.sleep(1)
-                        
-                        # Tag the file with the correct metadata (if not already embedded by postprocessor)
-                        if tag_audio_file(file_path, metadata, audio_format):
-                            success_count += 1
-                            logger.info(f"Successfully downloaded and tagged: {title} by {artist}")
-                        else:
-                            logger.warning(f"Failed to tag: {title} by {artist}")
-                    else:
-                        logger.warning(f"Expected file not found: {expected_filename}")
-                else:
-                    success_count += 1
+                # Tags and cover art were written by download_youtube's postprocessing chain
+                success_count += 1
+                logger.info(f"Successfully downloaded and tagged: {title} by {artist}")
             else:
                 logger.error(f"Failed to download: {title} by {artist}")
         else:
             status_callback(f"YouTube search failed for: {title} by {artist}")
             logger.warning(f"No YouTube URL found for: {title} by {artist}")
 
-    logger.info(f"Downloaded {success_count} out of {len(tracks)} tracks")
+    logger.info(f"Downloaded {success_count} out of {processed} tracks "
+                f"(YouTube matches: {match_cache.hits} cached, {match_cache.misses} searched; Spotify API: {spotify_stats()})")
+    if page_errors:
+        # The tracks after the failed page were never seen, so the job did not complete
+        status_callback(f"Spotify playlist incomplete: stopped after {processed} of {track_count} tracks ({page_errors[0]})")
+        return False
     return success_count > 0 
\ No newline at end of file
@@ -0,0 +1,173 @@
+import os
+import base64
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import mutagen
+from mutagen.id3 import ID3, ID3NoHeaderError, TIT2, TPE1, TALB, TDRC, TCON, TRCK, APIC
+from mutagen.flac import FLAC, Picture
+from mutagen.mp4 import MP4, MP4Cover
+from yt_dlp.postprocessor import PostProcessor
+
+logger = logging.getLogger(__name__)
+
+# Free space kept in the tag block so later edits are written in place instead of rewriting the file
+TAG_PADDING = 16 * 1024
+TAG_WORKERS = 4
+
+ID3_FRAMES = {
+    'title': TIT2,
+    'artist': TPE1,
+    'album': TALB,
+    'date': TDRC,
+    'genre': TCON,
+    'tracknumber': TRCK,
+}
+MP4_ATOMS = {
+    'title': '\xa9nam',
+    'artist': '\xa9ART',
+    'album': '\xa9alb',
+    'date': '\xa9day',
+    'genre': '\xa9gen',
+}
+
+def _padding(info):
+    # Reuse the existing padding when the new tags fit; otherwise reserve TAG_PADDING
+    return info.padding if info.padding >= 0 else TAG_PADDING
+
+def _cover_bytes(cover_art):
+    if isinstance(cover_art, str):
+        with open(cover_art, 'rb') as f:
+            return f.read()
+    return cover_art
+
+def _cover_mime(data):
+    return 'image/png' if data[:8] == b'\x89PNG\r\n\x1a\n' else 'image/jpeg'
+
+def _picture(data):
+    pic = Picture()
+    pic.data = data
+    pic.type = 3
+    pic.mime = _cover_mime(data)
+    pic.desc = 'Cover'
+    return pic
+
+def _track_number(value):
+    try:
+        return int(str(value).split('/')[0])
+    except (TypeError, ValueError):
+        return None
+
+def _write_id3(filepath, fields, cover):
+    try:
+        tags = ID3(filepath)
+    except ID3NoHeaderError:
+        tags = ID3()
+    for key, frame in ID3_FRAMES.items():
+        if key in fields:
+            tags.setall(frame.__name__, [frame(encoding=3, text=[str(fields[key])])])
+    if cover:
+        tags.setall('APIC', [APIC(encoding=3, mime=_cover_mime(cover), type=3, desc='Cover', data=cover)])
+    tags.save(filepath, padding=_padding)
+
+def _write_mp4(filepath, fields, cover):
+    audio = MP4(filepath)
+    if audio.tags is None:
+        audio.add_tags()
+    for key, atom in MP4_ATOMS.items():
+        if key in fields:
+            audio.tags[atom] = [str(fields[key])]
+    track = _track_number(fields.get('tracknumber'))
+    if track:
+        audio.tags['trkn'] = [(track, 0)]
+    if cover:
+        image_format = MP4Cover.FORMAT_PNG if _cover_mime(cover) == 'image/png' else MP4Cover.FORMAT_JPEG
+        audio.tags['covr'] = [MP4Cover(cover, imageformat=image_format)]
+    audio.save(padding=_padding)
+
+def _write_flac(filepath, fields, cover):
+    audio = FLAC(filepath)
+    for key, value in fields.items():
+        audio[key] = str(value)
+    if cover:
+        audio.clear_pictures()
+        audio.add_picture(_picture(cover))
+    audio.save(padding=_padding)
+
+def _write_vorbis_comments(filepath, fields, cover):
+    # Ogg Vorbis or Opus; mutagen picks the container type
+    audio = mutagen.File(filepath)
+    if audio is None:
+        raise ValueError('unrecognized Ogg file')
+    if audio.tags is None:
+        audio.add_tags()
+    for key, value in fields.items():
+        audio[key] = str(value)
+    if cover:
+        audio['metadata_block_picture'] = [base64.b64encode(_picture(cover).write()).decode('ascii')]
+    audio.save(padding=_padding)
+
+WRITERS = {
+    'mp3': _write_id3,
+    'm4a': _write_mp4,
+    'flac': _write_flac,
+    'ogg': _write_vorbis_comments,
+    'opus': _write_vorbis_comments,
+}
+
+def write_tags(filepath, metadata, audio_format):
+    """Write text tags, track number and cover art to a file in a single save.
+
+    metadata may hold title, artist, album, date, genre, tracknumber and cover_art
+    (bytes or an image path); empty values are skipped. Formats without a writer
+    are left untouched. Returns True on success.
+    """
+    writer = WRITERS.get(audio_format)
+    if writer is None:
+        logger.info(f"No tag writer for {audio_format}, leaving {os.path.basename(filepath)} untagged")
+        return True
+    fields = {k: v for k, v in metadata.items() if k != 'cover_art' and v not in (None, '')}
+    try:
+        cover = _cover_bytes(metadata.get('cover_art')) if metadata.get('cover_art') else None
+        writer(filepath, fields, cover)
+        return True
+    except Exception as e:
+        logger.error(f"Failed to tag {filepath}: {e}")
+        return False
+
+def tag_files(jobs, workers=TAG_WORKERS, tagger=write_tags):
+    """Tag many files from a thread pool.
+
+    jobs is an iterable of (filepath, metadata, audio_format); tagger is called
+    with each job (write_tags, or a wrapper that validates first). Returns a list
+    of results in the same order.
+    """
+    jobs = list(jobs)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(jobs) or 1))) as pool:
+        return list(pool.map(lambda job: tagger(*job), jobs))
+
+# ffmpeg reserves this much ID3v2/FLAC header space, so the tags written afterwards fit in place
+FFMPEG_HEADER_PADDING = 256 * 1024
+
+def ffmpeg_padding_args():
+    """postprocessor_args that make FFmpegExtractAudio leave room for tags and cover art"""
+    return {'extractaudio': ['-metadata_header_padding', str(FFMPEG_HEADER_PADDING)]}
+
+class TagEmbedPP(PostProcessor):
+    """yt-dlp postprocessor that tags the converted file before it is moved into place.
+
+    metadata is a dict or a callable taking the info dict; tagger is write_tags or a
+    wrapper with the same signature.
+    """
+
+    def __init__(self, metadata, audio_format, tagger=write_tags, downloader=None):
+        super().__init__(downloader)
+        self.metadata = metadata
+        self.audio_format = audio_format
+        self.tagger = tagger
+
+    def run(self, info):
+        filepath = info.get('filepath')
+        metadata = self.metadata(info) if callable(self.metadata) else self.metadata
+        if filepath and metadata and os.path.splitext(filepath)[1].lstrip('.').lower() == self.audio_format:
+            self.tagger(filepath, metadata, self.audio_format)
+        return [], info
@@ -1,4 +1,8 @@
 import yt_dlp
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+from downloader.normalize import alnum_key
 
 def search_youtube(query):
     ydl_opts = {'quiet': True, 'skip_download': True}
@@ -9,4 +13,51 @@ def search_youtube(query):
                 return f"https://www.youtube.com/watch?v={info['entries'][0]['id']}"
         except Exception:
             return None
-    return None 
\ No newline at end of file
+    return None 
+
+
+def match_confidence(entry, title, artist, duration_ms=None):
+    """0..1 estimate that a YouTube search result is the given track"""
+    video_title = alnum_key(entry.get('title') or '')
+    channel = alnum_key(entry.get('channel') or entry.get('uploader') or '')
+    title_key = alnum_key(title or '')
+    artist_key = alnum_key(artist or '')
+    title_score = 1.0 if title_key and title_key in video_title else SequenceMatcher(None, title_key, video_title).ratio()
+    artist_score = 1.0 if artist_key and (artist_key in video_title or artist_key in channel) else 0.0
+    if duration_ms and entry.get('duration'):
+        # Full marks within a few seconds, nothing beyond 30 s off
+        duration_score = max(0.0, 1.0 - max(0.0, abs(entry['duration'] - duration_ms / 1000) - 3) / 30)
+        return round(0.5 * title_score + 0.2 * artist_score + 0.3 * duration_score, 3)
+    return round((0.5 * title_score + 0.2 * artist_score) / 0.7, 3)
+
+def search_youtube_match(title, artist, duration_ms=None):
+    """Best search result for a track as (video_id, confidence), or (None, 0.0)"""
+    ydl_opts = {'quiet': True, 'skip_download': True, 'extract_flat': 'in_playlist'}
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        try:
+            info = ydl.extract_info(f"ytsearch1:{title} {artist} audio", download=False)
+        except Exception:
+            return None, 0.0
+    entries = [e for e in info.get('entries') or [] if e and e.get('id')]
+    if not entries:
+        return None, 0.0
+    return entries[0]['id'], match_confidence(entries[0], title, artist, duration_ms)
+
+def ordered_prefetch(func, items, workers=8, window=32):
+    """Yield func(item) for each item in order, computing up to `window` results ahead on a thread pool.
+
+    items may be any iterable (including a lazy generator); at most `window` results are held at once.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        items = iter(items)
+        for item in items:
+            pending.append(pool.submit(func, item))
+            if len(pending) >= window:
+                break
+        while pending:
+            result = pending.popleft().result()
+            for item in items:
+                pending.append(pool.submit(func, item))
+                break
+            yield result
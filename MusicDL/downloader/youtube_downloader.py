@@ -1,33 +1,25 @@
 import yt_dlp
 import os
 import subprocess
-from mutagen.easyid3 import EasyID3
-from mutagen.flac import FLAC
-from mutagen.mp4 import MP4, MP4Cover
-from mutagen.oggvorbis import OggVorbis
-from mutagen.id3 import ID3, APIC, error as ID3Error
-import re
-import time
-from mutagen.mp3 import MP3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from mutagen.id3 import ID3, ID3NoHeaderError
 import logging
+from downloader.library_index import get_library_index
+from downloader.cover_art import get_cover_art
+from downloader.tagging import write_tags, tag_files, TagEmbedPP, ffmpeg_padding_args
+from downloader.remux import RemuxOrExtractAudioPP, audio_format_selector
+from downloader.events import TrackReadyPP, JobManifest, file_ready_event
+from downloader.normalize import clean_metadata_value, clean_video_title, alnum_key, DESCRIPTION_ARTIST_PATTERNS
 
 # Set up logging for metadata operations
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def clean_metadata_value(value):
-    """Clean and validate metadata values to prevent duplicates and ensure accuracy"""
-    if not value:
-        return None
-    # Remove extra whitespace and normalize
-    cleaned = str(value).strip()
-    # Remove common problematic characters that can cause duplicates
-    cleaned = re.sub(r'[<>:"/\\|?*]', '', cleaned)
-    # Limit length to prevent overly long metadata
-    if len(cleaned) > 200:
-        cleaned = cleaned[:200]
-    return cleaned if cleaned else None
+# Number of playlist tracks downloaded and converted at the same time
+PLAYLIST_WORKERS = 4
+# Supported formats for direct yt-dlp conversion
+YT_DLP_FORMATS = ['mp3', 'm4a', 'flac', 'wav', 'opus', 'ogg', 'aac']
 
 def validate_metadata(metadata):
     """Validate metadata to ensure required fields are present and accurate"""
@@ -55,8 +47,8 @@ def validate_metadata(metadata):
     
     # Ensure title and artist are not too similar (potential duplicates)
     if 'title' in validated and 'artist' in validated:
-        title_norm = re.sub(r'[^a-zA-Z0-9]', '', validated['title'].lower())
-        artist_norm = re.sub(r'[^a-zA-Z0-9]', '', validated['artist'].lower())
+        title_norm = alnum_key(validated['title'])
+        artist_norm = alnum_key(validated['artist'])
         if title_norm == artist_norm and title_norm not in ['unknown', '']:
             logger.warning(f"Title and artist are identical: {validated['title']}")
             # Don't reject, just log the warning
@@ -64,131 +56,24 @@ def validate_metadata(metadata):
     return validated
 
 def tag_audio_file(filepath, metadata, audio_format):
-    """Tag audio file with validated metadata"""
-    try:
-        # Validate metadata before tagging
-        validated_metadata = validate_metadata(metadata)
-        if not validated_metadata:
-            logger.error(f"Invalid metadata for {filepath}")
-            return False
-            
-        logger.info(f"Tagging {filepath} with metadata: {validated_metadata}")
-        
-        if audio_format == 'mp3':
-            audio = EasyID3(filepath)
-            if 'title' in validated_metadata:
-                audio['title'] = validated_metadata['title']
-            if 'artist' in validated_metadata:
-                audio['artist'] = validated_metadata['artist']
-            if 'album' in validated_metadata:
-                audio['album'] = validated_metadata['album']
-            if 'date' in validated_metadata:
-                audio['date'] = validated_metadata['date']
-            if 'genre' in validated_metadata:
-                audio['genre'] = validated_metadata['genre']
-            if 'tracknumber' in validated_metadata:
-                audio['tracknumber'] = str(validated_metadata['tracknumber'])
-            audio.save()
-            # Add cover art if present
-            if 'cover_art' in validated_metadata and validated_metadata['cover_art']:
-                try:
-                    id3 = ID3(filepath)
-                    cover_data = validated_metadata['cover_art']
-                    if isinstance(cover_data, str):
-                        with open(cover_data, 'rb') as imgf:
-                            cover_data = imgf.read()
-                    id3.add(APIC(
-                        encoding=3, mime='image/jpeg', type=3, desc='Cover', data=cover_data
-                    ))
-                    id3.save()
-                except ID3Error:
-                    logger.warning(f"Failed to add cover art to {filepath}")
-        elif audio_format == 'flac':
-            audio = FLAC(filepath)
-            for k, v in validated_metadata.items():
-                if k != 'cover_art':
-                    audio[k] = v
-            if 'cover_art' in validated_metadata and validated_metadata['cover_art']:
-                from mutagen.flac import Picture
-                pic = Picture()
-                cover_data = validated_metadata['cover_art']
-                if isinstance(cover_data, str):
-                    with open(cover_data, 'rb') as imgf:
-                        cover_data = imgf.read()
-                pic.data = cover_data
-                pic.type = 3
-                pic.mime = 'image/jpeg'
-                audio.add_picture(pic)
-            audio.save()
-        elif audio_format == 'm4a':
-            audio = MP4(filepath)
-            if 'title' in validated_metadata:
-                audio['nam'] = [validated_metadata['title']]
-            if 'artist' in validated_metadata:
-                audio['ART'] = [validated_metadata['artist']]
-            if 'album' in validated_metadata:
-                audio['alb'] = [validated_metadata['album']]
-            if 'date' in validated_metadata:
-                audio['day'] = [validated_metadata['date']]
-            if 'genre' in validated_metadata:
-                audio['gen'] = [validated_metadata['genre']]
-            if 'tracknumber' in validated_metadata:
-                audio['trkn'] = [(int(validated_metadata['tracknumber']), 0)]
-            if 'cover_art' in validated_metadata and validated_metadata['cover_art']:
-                cover_data = validated_metadata['cover_art']
-                if isinstance(cover_data, str):
-                    with open(cover_data, 'rb') as imgf:
-                        cover_data = imgf.read()
-                audio['covr'] = [MP4Cover(cover_data, imageformat=MP4Cover.FORMAT_JPEG)]
-            audio.save()
-        elif audio_format == 'opus':
-            audio = OggVorbis(filepath)
-            for k, v in validated_metadata.items():
-                if k != 'cover_art':
-                    audio[k] = v
-            audio.save()
-        
+    """Tag audio file with validated metadata in a single write"""
+    # Cover art is bytes or a path; keep it out of the text cleanup
+    validated_metadata = validate_metadata({k: v for k, v in metadata.items() if k != 'cover_art'})
+    if not validated_metadata:
+        logger.error(f"Invalid metadata for {filepath}")
+        return False
+    logger.info(f"Tagging {filepath} with metadata: {validated_metadata}")
+    validated_metadata['cover_art'] = metadata.get('cover_art')
+    if write_tags(filepath, validated_metadata, audio_format):
         logger.info(f"Successfully tagged {filepath}")
         return True
-    except Exception as e:
-        logger.error(f"Failed to tag {filepath}: {e}")
-        return False
-
-def normalize_filename(artist, title):
-    """Improved filename normalization for better duplicate detection"""
-    if not artist or not title:
-        return None
-    
-    # Clean and normalize both artist and title
-    artist_clean = clean_metadata_value(artist)
-    title_clean = clean_metadata_value(title)
-    
-    if not artist_clean or not title_clean:
-        return None
-    
-    base = f"{artist_clean} - {title_clean}"
-    # Remove common patterns that don't affect uniqueness
-    base = re.sub(r'\([^)]*\)', '', base)  # Remove parentheses content
-    base = re.sub(r'\[[^\]]*\]', '', base)  # Remove bracket content
-    base = re.sub(r'feat\.?|ft\.?|featuring', '', base, flags=re.IGNORECASE)  # Remove featuring
-    base = re.sub(r'[^a-zA-Z0-9\s]+', '', base)  # Keep only alphanumeric and spaces
-    base = re.sub(r'\s+', ' ', base).strip()  # Normalize whitespace
-    return base.lower()
+    return False
 
 def file_exists(download_dir, artist, title, audio_format):
-    """Improved duplicate detection with better normalization"""
-    norm = normalize_filename(artist, title)
-    if not norm:
-        return False
-    
-    for file in os.listdir(download_dir):
-        if file.lower().endswith('.' + audio_format):
-            name = os.path.splitext(file)[0]
-            name_norm = normalize_filename(name.split(' - ')[0] if ' - ' in name else '', 
-                                         name.split(' - ')[1] if ' - ' in name else name)
-            if name_norm and name_norm == norm:
-                logger.info(f"Duplicate detected: {artist} - {title}")
-                return True
+    """Duplicate detection against the persistent library index (filenames and tags)"""
+    if get_library_index(download_dir).contains(artist, title, audio_format):
+        logger.info(f"Duplicate detected: {artist} - {title}")
+        return True
     return False
 
 def extract_metadata_from_video(video_info):
@@ -198,13 +83,8 @@ def extract_metadata_from_video(video_info):
     try:
         # Extract title and clean it
         if 'title' in video_info:
-            title = video_info['title']
             # Remove common YouTube suffixes
-            title = re.sub(r'\s*\(Official.*?\)', '', title, flags=re.IGNORECASE)
-            title = re.sub(r'\s*\[Official.*?\]', '', title, flags=re.IGNORECASE)
-            title = re.sub(r'\s*\(Lyrics.*?\)', '', title, flags=re.IGNORECASE)
-            title = re.sub(r'\s*\[Lyrics.*?\]', '', title, flags=re.IGNORECASE)
-            metadata['title'] = clean_metadata_value(title)
+            metadata['title'] = clean_metadata_value(clean_video_title(video_info['title']))
         
         # Extract artist from title or uploader
         if 'uploader' in video_info:
@@ -221,27 +101,17 @@ def extract_metadata_from_video(video_info):
             desc = video_info['description']
             # Look for artist in description
             if not metadata.get('artist') and desc:
-                # Common patterns in music video descriptions
-                artist_patterns = [
-                    r'Artist:\s*([^\n]+)',
-                    r'Performed by:\s*([^\n]+)',
-                    r'by\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)',
-                ]
-                for pattern in artist_patterns:
-                    match = re.search(pattern, desc, re.IGNORECASE)
+                for pattern in DESCRIPTION_ARTIST_PATTERNS:
+                    match = pattern.search(desc)
                     if match:
                         metadata['artist'] = clean_metadata_value(match.group(1))
                         break
         
         # Extract thumbnail as cover art
         if 'thumbnail' in video_info:
-            try:
-                import requests
-                resp = requests.get(video_info['thumbnail'])
-                if resp.status_code == 200:
-                    metadata['cover_art'] = resp.content
-            except Exception:
-                pass
+            cover_art = get_cover_art(video_info['thumbnail'])
+            if cover_art:
+                metadata['cover_art'] = cover_art
         
         logger.info(f"Extracted metadata: {metadata}")
         return metadata
@@ -250,20 +120,84 @@ def extract_metadata_from_video(video_info):
         logger.error(f"Failed to extract metadata from video: {e}")
         return {}
 
-def cleanup_downloads(download_dir, allowed_exts=(".mp3", ".mp4", ".m4a", ".flac", ".wav", ".opus", ".ogg", ".aac"), retries=3, delay=2):
-    for attempt in range(retries):
-        files_to_delete = [f for f in os.listdir(download_dir) if not f.lower().endswith(allowed_exts)]
-        if not files_to_delete:
-            break
-        for f in files_to_delete:
+def add_audio_postprocessors(ydl, target_format, metadata, on_ready):
+    """Convert (or stream-copy) to target_format and tag in yt-dlp's postprocessing chain,
+    then call on_ready(info) once the final file is in place"""
+    if target_format in YT_DLP_FORMATS:
+        ydl.add_post_processor(RemuxOrExtractAudioPP(preferredcodec=target_format, preferredquality='192'), when='post_process')
+    ydl.add_post_processor(TagEmbedPP(metadata, target_format, tagger=tag_audio_file), when='post_process')
+    ydl.add_post_processor(TrackReadyPP(on_ready), when='after_move')
+
+def file_ready_handler(out_dir, target_format, metadata, status_callback, ready_paths, manifest):
+    """on_ready callback: record the final path, index it and announce it to status_callback"""
+    def on_ready(info):
+        path = info.get('filepath')
+        if not path:
+            return
+        manifest.keep(path)
+        ready_paths.append(path)
+        if target_format in YT_DLP_FORMATS:
+            get_library_index(out_dir).add(path, metadata)
+            status_callback(file_ready_event(path, {k: v for k, v in metadata.items() if k != 'cover_art'}))
+    return on_ready
+
+def _download_playlist(entries, ydl_opts, out_dir, target_format, status_callback, workers, ready_paths, manifest):
+    """Download playlist entries on a worker pool, each with its own postprocessing"""
+    total_tracks = len(entries)
+    lock = threading.Lock()
+    track_bytes = {}
+
+    def combined_progress():
+        # Tracks that have not started yet are assumed to be as large as the average started one
+        downloaded = sum(done for done, _ in track_bytes.values())
+        known_totals = [total for _, total in track_bytes.values() if total]
+        estimate = sum(known_totals) / len(known_totals) * total_tracks if known_totals else 0
+        return {
+            'status': 'downloading',
+            'downloaded_bytes': downloaded,
+            'total_bytes': max(int(estimate), downloaded),
+            'tracks_started': len(track_bytes),
+            'tracks_total': total_tracks,
+        }
+
+    def download_entry(index, entry):
+        url = entry.get('url') or entry.get('webpage_url') or entry.get('id')
+
+        def hook(d):
+            if d.get('status') not in ('downloading', 'finished'):
+                return
+            with lock:
+                total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+                track_bytes[index] = (d.get('downloaded_bytes') or total, total)
+                progress = combined_progress()
+            status_callback(progress)
+
+        opts = dict(ydl_opts, noplaylist=True, progress_hooks=[hook, manifest.progress_hook])
+        opts.pop('extract_flat', None)
+        with yt_dlp.YoutubeDL(opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+            metadata = extract_metadata_from_video(info)
+            add_audio_postprocessors(ydl, target_format, metadata,
+                                     file_ready_handler(out_dir, target_format, metadata, status_callback, ready_paths, manifest))
+            ydl.process_ie_result(info, download=True)
+        return metadata
+
+    completed = failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(download_entry, i, entry): i for i, entry in enumerate(entries)}
+        for future in as_completed(futures):
+            index = futures[future]
             try:
-                os.remove(os.path.join(download_dir, f))
+                metadata = future.result()
+                completed += 1
+                status_callback(f"Downloaded {completed}/{total_tracks}: {metadata.get('title') or 'track ' + str(index + 1)}")
             except Exception as e:
-                if attempt == retries - 1:
-                    print(f"Failed to delete {f} after {retries} attempts: {e}")
-        time.sleep(delay)
+                failed += 1
+                logger.error(f"Playlist track {index + 1} failed: {e}")
+                status_callback(f"Failed track {index + 1}/{total_tracks}: {e}")
+    return completed, failed
 
-def download_youtube(link, mode, status_callback, download_dir=None, target_format='mp3', metadata=None):
+def download_youtube(link, mode, status_callback, download_dir=None, target_format='mp3', metadata=None, workers=PLAYLIST_WORKERS):
     out_dir = download_dir or os.path.join(os.path.dirname(__file__), '..', 'downloads')
     os.makedirs(out_dir, exist_ok=True)
     
@@ -280,6 +214,9 @@ def download_youtube(link, mode, status_callback, download_dir=None, target_form
             status_callback(f"Skipped (already exists): {metadata['artist']} - {metadata['title']}")
             return True
     
+    # Final paths reported by yt-dlp once each file is complete, and the intermediates this job created
+    ready_paths = []
+    manifest = JobManifest()
     progress_event_received = {'flag': False}
     def wrapped_status_callback(d):
         if isinstance(d, dict) and d.get('status') == 'downloading':
@@ -291,109 +228,87 @@ def download_youtube(link, mode, status_callback, download_dir=None, target_form
         'format': 'bestaudio/best',
         'outtmpl': os.path.join(out_dir, '%(title)s.%(ext)s'),
         'noplaylist': False,
+        # List playlist entries without resolving each one; tracks are resolved by the workers
+        'extract_flat': 'in_playlist',
         'quiet': True,
+        'progress_hooks': [manifest.progress_hook],
+        'postprocessor_hooks': [manifest.postprocessor_hook],
     }
-    postprocessors = []
-    # Supported formats for direct yt-dlp conversion
-    yt_dlp_formats = ['mp3', 'm4a', 'flac', 'wav', 'opus', 'ogg', 'aac']
-    if target_format in yt_dlp_formats:
-        postprocessors.append({
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': target_format,
-            'preferredquality': '192',
-        })
-    ydl_opts['postprocessors'] = postprocessors
+    if target_format in YT_DLP_FORMATS:
+        # Prefer a source stream that can be copied instead of re-encoded
+        ydl_opts['format'] = audio_format_selector(target_format)
+        # Leave header room so the tags written right after conversion fit in place
+        ydl_opts['postprocessor_args'] = ffmpeg_padding_args()
     
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # Extract video info first for metadata
-            if not metadata:
-                try:
-                    video_info = ydl.extract_info(link, download=False)
-                    metadata = extract_metadata_from_video(video_info)
-                except Exception as e:
-                    logger.warning(f"Failed to extract video info: {e}")
-                    metadata = {}
+            # Extract once; the resolved info dict feeds both metadata and the download
+            try:
+                video_info = ydl.extract_info(link, download=False)
+            except Exception as e:
+                logger.warning(f"Failed to extract video info: {e}")
+                video_info = None
+
+            is_playlist = bool(video_info) and video_info.get('_type') == 'playlist'
+            if is_playlist:
+                entries = [entry for entry in video_info.get('entries') or [] if entry]
+                status_callback(f"Playlist: {len(entries)} tracks, downloading {min(workers, len(entries))} at a time")
+                completed, failed = _download_playlist(entries, ydl_opts, out_dir, target_format, wrapped_status_callback, workers, ready_paths, manifest)
+                status_callback(f"Playlist finished: {completed} downloaded, {failed} failed")
+            else:
+                if not metadata:
+                    metadata = extract_metadata_from_video(video_info) if video_info else {}
             
-            # Ensure we have at least basic metadata for filename generation
-            if not metadata or not metadata.get('title') or not metadata.get('artist'):
-                logger.warning("Using fallback metadata for filename generation")
-                # Extract basic info from yt-dlp for filename
-                try:
-                    video_info = ydl.extract_info(link, download=False)
-                    fallback_title = video_info.get('title', 'Unknown Title')
-                    fallback_artist = video_info.get('uploader', 'Unknown Artist')
+                # Ensure we have at least basic metadata for filename generation
+                if not metadata or not metadata.get('title') or not metadata.get('artist'):
+                    logger.warning("Using fallback metadata for filename generation")
                     if not metadata:
                         metadata = {}
-                    metadata['title'] = metadata.get('title') or clean_metadata_value(fallback_title)
-                    metadata['artist'] = metadata.get('artist') or clean_metadata_value(fallback_artist)
-                except Exception as e:
-                    logger.error(f"Failed to get fallback metadata: {e}")
-                    # Use completely generic metadata
-                    if not metadata:
-                        metadata = {'title': 'Unknown Title', 'artist': 'Unknown Artist'}
+                    if video_info:
+                        fallback_title = video_info.get('title', 'Unknown Title')
+                        fallback_artist = video_info.get('uploader', 'Unknown Artist')
+                        metadata['title'] = metadata.get('title') or clean_metadata_value(fallback_title)
+                        metadata['artist'] = metadata.get('artist') or clean_metadata_value(fallback_artist)
+                    else:
+                        # Use completely generic metadata
+                        metadata['title'] = metadata.get('title') or 'Unknown Title'
+                        metadata['artist'] = metadata.get('artist') or 'Unknown Artist'
             
-            # Download and convert in one step
-            logger.info(f"Starting download with conversion to {target_format}")
-            result = ydl.download([link])
+                # Download, convert and tag in one postprocessing chain
+                add_audio_postprocessors(ydl, target_format, metadata,
+                                         file_ready_handler(out_dir, target_format, metadata, wrapped_status_callback, ready_paths, manifest))
+                logger.info(f"Starting download with conversion to {target_format}")
+                if video_info:
+                    ydl.process_ie_result(video_info, download=True)
+                else:
+                    ydl.download([link])
         
         # If no progress event was received, warn the GUI
         if not progress_event_received['flag']:
             status_callback('Warning: No progress events received from yt-dlp. Progress bar may not update.')
         
-        # Tag the converted file with metadata (if not already embedded by postprocessor)
-        if target_format != 'original' and metadata and 'artist' in metadata and 'title' in metadata:
-            expected_filename = f"{metadata['artist']} - {metadata['title']}.{target_format}"
-            file_path = os.path.join(out_dir, expected_filename)
-            if os.path.exists(file_path):
-                # Wait for file to be fully written
-                for _ in range(10):  # Try for up to 10 seconds
-                    try:
-                        with open(file_path, 'ab') as f:
-                            pass
-                        break
-                    except OSError:
-                        time.sleep(1)
-                
-                # Tag with metadata (this will overwrite any basic metadata from postprocessor)
-                if tag_audio_file(file_path, metadata, target_format):
-                    logger.info(f"Successfully tagged converted file: {expected_filename}")
-                else:
-                    logger.warning(f"Failed to tag converted file: {expected_filename}")
-        
-        # Clean up only thumbnail files (no .webm files should exist since we convert during download)
-        for file in os.listdir(out_dir):
-            if file.lower().endswith(('.jpg', '.png', '.webp')):
-                try:
-                    os.remove(os.path.join(out_dir, file))
-                except Exception:
-                    pass
-        
         # If the format is not natively supported, convert with ffmpeg
-        if target_format not in yt_dlp_formats:
-            # Find the downloaded file (assume only one new file)
-            files = [f for f in os.listdir(out_dir) if f.lower().endswith(('.mp3', '.m4a', '.flac', '.wav', '.opus', '.ogg', '.aac'))]
-            if files:
-                src_file = os.path.join(out_dir, files[0])
+        if target_format not in YT_DLP_FORMATS:
+            for src_file in ready_paths:
                 dest_file = os.path.splitext(src_file)[0] + f'.{target_format}'
                 subprocess.run(['ffmpeg', '-y', '-i', src_file, dest_file])
                 os.remove(src_file)
+                get_library_index(out_dir).add(dest_file, metadata)
+                status_callback(file_ready_event(dest_file))
         
-        # Delay and retry cleanup to avoid file-in-use errors
-        cleanup_downloads(out_dir)
         return True
     except Exception as e:
         status_callback(f'yt-dlp error: {e}')
         logger.error(f"Download failed: {e}")
         return False
+    finally:
+        # Only files this job created; other jobs writing to the same folder are untouched
+        manifest.cleanup()
 
 if __name__ == '__main__':
     import sys
     import glob
-    import requests
-    import spotipy
-    from spotipy.oauth2 import SpotifyClientCredentials
-    import json
+    from downloader.spotify_client import get_spotify_client
 
     if '--clear-metadata' in sys.argv:
         downloads_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'downloads'))
@@ -412,19 +327,13 @@ if __name__ == '__main__':
                 print(f"Error clearing {os.path.basename(file_path)}: {e}")
         sys.exit(0)
 
-    # Load Spotify credentials
-    cred_path = os.path.join(os.path.dirname(__file__), '..', 'config', 'spotify_credentials.json')
-    with open(cred_path, 'r') as f:
-        creds = json.load(f)
-    sp = spotipy.Spotify(auth_manager=SpotifyClientCredentials(
-        client_id=creds['client_id'],
-        client_secret=creds['client_secret']
-    ))
+    sp = get_spotify_client()
 
     downloads_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'downloads'))
     files = glob.glob(os.path.join(downloads_dir, '*.mp3'))
     print(f"Found {len(files)} mp3 files in downloads.")
 
+    jobs = []
     for file_path in files:
         filename = os.path.basename(file_path)
         # Try to parse artist and title from filename: 'Artist - Title.mp3'
@@ -445,15 +354,12 @@ if __name__ == '__main__':
             # Fetch cover art
             cover_art = None
             if t['album']['images']:
-                cover_url = t['album']['images'][0]['url']
-                try:
-                    resp = requests.get(cover_url)
-                    if resp.status_code == 200:
-                        cover_art = resp.content
-                except Exception:
-                    cover_art = None
+                cover_art = get_cover_art(t['album']['images'][0]['url'])
             metadata = {'title': title, 'artist': artist, 'album': album, 'date': date, 'genre': genre, 'tracknumber': tracknumber, 'cover_art': cover_art}
-            tag_audio_file(file_path, metadata, 'mp3')
-            print(f"Tagged: {filename}")
+            jobs.append((file_path, metadata, 'mp3'))
         else:
-            print(f"No Spotify match for: {filename}") 
\ No newline at end of file
+            print(f"No Spotify match for: {filename}")
+
+    # Each file is written once; files are tagged in parallel
+    for (file_path, _, _), ok in zip(jobs, tag_files(jobs, tagger=tag_audio_file)):
+        print(f"{'Tagged' if ok else 'Failed to tag'}: {os.path.basename(file_path)}") 
\ No newline at end of file
@@ -0,0 +1,78 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+# Upper bound on how long the expiry thread sleeps, so it sees deadlines set by other workers
+EXPIRY_POLL_INTERVAL = 30
+# Finished task progress is kept this long for late progress-page visits
+PROGRESS_RETENTION = 24 * 3600
+
+class FileExpiryScheduler:
+    """Thread that deletes downloaded files at their deadline or, least recently used
+    first, whenever the tracked files exceed the disk quota. Deadlines and leases live
+    in the job store, so every worker honours them. Leased files (being served or
+    zipped) are never deleted; an expired lease holder is removed on release."""
+    def __init__(self, store, quota_bytes, ttl):
+        self.store = store
+        self.quota_bytes = quota_bytes
+        self.ttl = ttl
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def schedule(self, path, delay=None, deadline=None, replace=True):
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        if deadline is None:
+            deadline = time.time() + (self.ttl if delay is None else delay)
+        self.store.schedule_file(path, deadline, size, replace)
+        self.delete(self.store.claim_over_quota(self.quota_bytes))
+        with self.cond:
+            self.cond.notify()
+
+    def acquire(self, path):
+        """Lease path so it cannot be deleted; returns the lease id to release."""
+        return self.store.acquire_lease(path)
+
+    def release(self, path, lease_id):
+        self.store.release_lease(lease_id)
+        if self.store.claim_released_file(path):
+            self.delete([path])
+        else:
+            self.delete(self.store.claim_over_quota(self.quota_bytes))
+
+    @contextmanager
+    def lease(self, path):
+        lease_id = self.acquire(path)
+        try:
+            yield
+        finally:
+            self.release(path, lease_id)
+
+    def delete(self, paths):
+        for path in paths:
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+                    print(f"[CLEANUP] Deleted: {path}")
+            except Exception as e:
+                print(f"[CLEANUP ERROR] Could not delete {path}: {e}")
+
+    def run(self):
+        while True:
+            try:
+                self.delete(self.store.claim_expired_files(time.time()))
+                self.store.prune_progress(time.time() - PROGRESS_RETENTION)
+                deadline = self.store.next_deadline()
+            except Exception as e:
+                logging.error(f"[Cleanup] Error expiring downloads: {e}")
+                deadline = None
+            timeout = EXPIRY_POLL_INTERVAL if deadline is None else min(EXPIRY_POLL_INTERVAL, max(0, deadline - time.time()))
+            with self.cond:
+                self.cond.wait(timeout)
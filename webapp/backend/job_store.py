@@ -0,0 +1,486 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import itertools
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Every process refreshes the heartbeat of the jobs it owns (queued or running);
+# a job whose owner has been silent this long is taken over by another process
+JOB_HEARTBEAT_INTERVAL = 15
+JOB_STALE_SECONDS = 120
+# Identifies this process as a job owner; the token tells a restarted process from its predecessor
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+# Leases and in-progress marks left behind by a crashed worker stop counting after this
+LEASE_MAX_AGE = 6 * 3600
+
+class JobStore(ABC):
+    """Interface for job state shared by every process serving the app."""
+    @abstractmethod
+    def get_progress(self, task_id):
+        ...
+
+    @abstractmethod
+    def progress_version(self, task_id):
+        """Counter bumped on every progress write, so watchers can skip unchanged reads; None if unknown."""
+
+    @abstractmethod
+    def set_progress(self, task_id, prog):
+        ...
+
+    @abstractmethod
+    def prune_progress(self, before):
+        ...
+
+    @abstractmethod
+    def claim_job(self, key, task_id, prog, request):
+        """Register task_id (with initial progress) as the job for key unless a live job
+        already owns it; return the owning task_id. request is the queue entry
+        (url, format, download_type) needed to run the job again elsewhere."""
+
+    @abstractmethod
+    def release_job(self, task_id):
+        ...
+
+    @abstractmethod
+    def heartbeat(self):
+        """Mark the jobs this process owns as still alive."""
+
+    @abstractmethod
+    def claim_orphaned_jobs(self):
+        """Take over unfinished jobs whose owning process is gone and return their
+        (task_id, request) pairs to requeue; finished ones are released."""
+
+    @abstractmethod
+    def mark_busy(self, path, busy=True):
+        ...
+
+    @abstractmethod
+    def busy_paths(self):
+        ...
+
+    @abstractmethod
+    def schedule_file(self, path, deadline, size, replace=True):
+        ...
+
+    @abstractmethod
+    def acquire_lease(self, path):
+        """Lease path and mark it as the most recently used file; returns the lease id."""
+
+    @abstractmethod
+    def release_lease(self, lease_id):
+        ...
+
+    @abstractmethod
+    def next_deadline(self):
+        ...
+
+    @abstractmethod
+    def claim_expired_files(self, now):
+        """Remove and return expired, unleased files; leased ones are flagged for deletion on release."""
+
+    @abstractmethod
+    def claim_released_file(self, path):
+        """Remove and return True if path expired while leased and no lease remains."""
+
+    @abstractmethod
+    def claim_over_quota(self, quota_bytes):
+        """Remove and return least recently used unleased files until the total fits the quota."""
+
+    @abstractmethod
+    def cache_get(self, key):
+        """Result cache entry {'path', 'filename', 'size'} for key, or None."""
+
+    @abstractmethod
+    def cache_put(self, key, entry, max_bytes):
+        """Store entry as the most recently used; evict least recently used entries (never
+        the new one) until the total fits max_bytes and return the evicted entries."""
+
+    @abstractmethod
+    def cache_touch(self, accessed):
+        """Record cache hits; accessed maps key -> access time."""
+
+    @abstractmethod
+    def cache_remove(self, key):
+        ...
+
+    @abstractmethod
+    def cache_summary(self):
+        """(entry count, total bytes) of the result cache."""
+
+class MemoryJobStore(JobStore):
+    """Process-local JobStore; only correct with a single uvicorn worker."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.progress = {}  # task_id -> (prog, updated)
+        self.versions = {}  # task_id -> progress writes so far
+        self.jobs = {}  # key -> task_id
+        self.busy = {}  # path -> since
+        self.files = OrderedDict()  # path -> {'deadline', 'size', 'expired'}, least recently used first
+        self.leases = {}  # lease_id -> (path, acquired)
+        self.lease_ids = itertools.count(1)
+        self.cache = OrderedDict()  # key -> {'path', 'filename', 'size'}, least recently used first
+
+    def get_progress(self, task_id):
+        with self.lock:
+            entry = self.progress.get(task_id)
+            return dict(entry[0]) if entry else None
+
+    def progress_version(self, task_id):
+        with self.lock:
+            return self.versions.get(task_id)
+
+    def set_progress(self, task_id, prog):
+        with self.lock:
+            self.progress[task_id] = (dict(prog), time.time())
+            self.versions[task_id] = self.versions.get(task_id, 0) + 1
+
+    def prune_progress(self, before):
+        with self.lock:
+            for task_id in [t for t, (_, updated) in self.progress.items() if updated < before]:
+                del self.progress[task_id]
+                self.versions.pop(task_id, None)
+
+    def claim_job(self, key, task_id, prog, request):
+        # Jobs never outlive this process, so a registered job is always live
+        with self.lock:
+            owner = self.jobs.get(key)
+            if owner is not None:
+                return owner
+            self.jobs[key] = task_id
+            self.progress[task_id] = (dict(prog), time.time())
+            self.versions[task_id] = self.versions.get(task_id, 0) + 1
+            return task_id
+
+    def release_job(self, task_id):
+        with self.lock:
+            for key in [k for k, t in self.jobs.items() if t == task_id]:
+                del self.jobs[key]
+
+    def heartbeat(self):
+        pass
+
+    def claim_orphaned_jobs(self):
+        return []
+
+    def mark_busy(self, path, busy=True):
+        with self.lock:
+            if busy:
+                self.busy[path] = time.time()
+            else:
+                self.busy.pop(path, None)
+
+    def busy_paths(self):
+        with self.lock:
+            cutoff = time.time() - LEASE_MAX_AGE
+            return {path for path, since in self.busy.items() if since > cutoff}
+
+    def schedule_file(self, path, deadline, size, replace=True):
+        with self.lock:
+            if replace or path not in self.files:
+                self.files[path] = {'deadline': deadline, 'size': size, 'expired': False}
+                self.files.move_to_end(path)
+
+    def acquire_lease(self, path):
+        with self.lock:
+            lease_id = next(self.lease_ids)
+            self.leases[lease_id] = (path, time.time())
+            if path in self.files:
+                self.files.move_to_end(path)
+            return lease_id
+
+    def release_lease(self, lease_id):
+        with self.lock:
+            self.leases.pop(lease_id, None)
+
+    def _leased(self):
+        cutoff = time.time() - LEASE_MAX_AGE
+        return {path for path, acquired in self.leases.values() if acquired > cutoff}
+
+    def next_deadline(self):
+        with self.lock:
+            deadlines = [entry['deadline'] for entry in self.files.values() if not entry['expired']]
+            return min(deadlines) if deadlines else None
+
+    def claim_expired_files(self, now):
+        with self.lock:
+            leased = self._leased()
+            claimed = []
+            for path, entry in list(self.files.items()):
+                if entry['deadline'] > now:
+                    continue
+                if path in leased:
+                    entry['expired'] = True
+                else:
+                    del self.files[path]
+                    claimed.append(path)
+            return claimed
+
+    def claim_released_file(self, path):
+        with self.lock:
+            entry = self.files.get(path)
+            if entry is None or not entry['expired'] or path in self._leased():
+                return False
+            del self.files[path]
+            return True
+
+    def claim_over_quota(self, quota_bytes):
+        with self.lock:
+            total = sum(entry['size'] for entry in self.files.values())
+            leased = self._leased()
+            claimed = []
+            for path in list(self.files):
+                if total <= quota_bytes:
+                    break
+                if path in leased:
+                    continue
+                total -= self.files.pop(path)['size']
+                claimed.append(path)
+            return claimed
+
+    def cache_get(self, key):
+        with self.lock:
+            entry = self.cache.get(key)
+            return dict(entry) if entry else None
+
+    def cache_put(self, key, entry, max_bytes):
+        with self.lock:
+            self.cache[key] = dict(entry)
+            self.cache.move_to_end(key)
+            total = sum(e['size'] for e in self.cache.values())
+            evicted = []
+            while total > max_bytes and len(self.cache) > 1:
+                _, old = self.cache.popitem(last=False)
+                total -= old['size']
+                evicted.append(old)
+            return evicted
+
+    def cache_touch(self, accessed):
+        with self.lock:
+            for key in sorted(accessed, key=accessed.get):
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+
+    def cache_remove(self, key):
+        with self.lock:
+            self.cache.pop(key, None)
+
+    def cache_summary(self):
+        with self.lock:
+            return len(self.cache), sum(e['size'] for e in self.cache.values())
+
+class SQLiteJobStore(JobStore):
+    """JobStore backed by one SQLite database in WAL mode, shared by every worker process."""
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS progress (task_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL,
+                                             version INTEGER NOT NULL DEFAULT 0);
+        CREATE INDEX IF NOT EXISTS progress_updated ON progress (updated);
+        CREATE TABLE IF NOT EXISTS jobs (key TEXT PRIMARY KEY, task_id TEXT NOT NULL, request TEXT NOT NULL,
+                                         owner TEXT NOT NULL, heartbeat REAL NOT NULL);
+        CREATE INDEX IF NOT EXISTS jobs_task ON jobs (task_id);
+        CREATE TABLE IF NOT EXISTS busy_files (path TEXT PRIMARY KEY, since REAL NOT NULL);
+        CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, deadline REAL NOT NULL, size INTEGER NOT NULL,
+                                          last_access REAL NOT NULL, expired INTEGER NOT NULL DEFAULT 0);
+        CREATE INDEX IF NOT EXISTS files_deadline ON files (expired, deadline);
+        CREATE INDEX IF NOT EXISTS files_access ON files (last_access);
+        CREATE TABLE IF NOT EXISTS leases (id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT NOT NULL, acquired REAL NOT NULL);
+        CREATE INDEX IF NOT EXISTS leases_path ON leases (path, acquired);
+        CREATE TABLE IF NOT EXISTS cache_entries (key TEXT PRIMARY KEY, path TEXT NOT NULL, filename TEXT NOT NULL,
+                                                  size INTEGER NOT NULL, last_access REAL NOT NULL);
+        CREATE INDEX IF NOT EXISTS cache_entries_access ON cache_entries (last_access);
+    '''
+    LIVE_LEASE = 'SELECT 1 FROM leases WHERE leases.path = files.path AND leases.acquired > ?'
+    SET_PROGRESS = ('INSERT INTO progress (task_id, data, updated, version) VALUES (?, ?, ?, 1) '
+                    'ON CONFLICT (task_id) DO UPDATE SET data = excluded.data, updated = excluded.updated, '
+                    'version = progress.version + 1')
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.local = threading.local()
+        self.connection().executescript(self.SCHEMA)
+
+    def connection(self):
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self.local.db = db
+        return db
+
+    @contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front so read-modify-write steps are atomic across processes
+        db = self.connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def get_progress(self, task_id):
+        row = self.connection().execute('SELECT data FROM progress WHERE task_id = ?', (task_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def progress_version(self, task_id):
+        row = self.connection().execute('SELECT version FROM progress WHERE task_id = ?', (task_id,)).fetchone()
+        return row[0] if row else None
+
+    def set_progress(self, task_id, prog):
+        self.connection().execute(self.SET_PROGRESS, (task_id, json.dumps(prog), time.time()))
+
+    def prune_progress(self, before):
+        self.connection().execute('DELETE FROM progress WHERE updated < ?', (before,))
+
+    def claim_job(self, key, task_id, prog, request):
+        key = json.dumps(list(key))
+        with self.transaction() as db:
+            row = db.execute('SELECT task_id FROM jobs WHERE key = ? AND heartbeat > ?',
+                             (key, time.time() - JOB_STALE_SECONDS)).fetchone()
+            if row:
+                return row[0]
+            db.execute('INSERT OR REPLACE INTO jobs (key, task_id, request, owner, heartbeat) VALUES (?, ?, ?, ?, ?)',
+                       (key, task_id, json.dumps(list(request)), PROCESS_ID, time.time()))
+            db.execute(self.SET_PROGRESS, (task_id, json.dumps(prog), time.time()))
+            return task_id
+
+    def release_job(self, task_id):
+        self.connection().execute('DELETE FROM jobs WHERE task_id = ?', (task_id,))
+
+    def heartbeat(self):
+        self.connection().execute('UPDATE jobs SET heartbeat = ? WHERE owner = ?', (time.time(), PROCESS_ID))
+
+    @staticmethod
+    def owner_gone(owner):
+        """True if owner is a process on this host that has exited (or been restarted)."""
+        host, _, rest = owner.partition(':')
+        pid = rest.partition(':')[0]
+        if host != socket.gethostname() or not pid.isdigit():
+            return False
+        if int(pid) == os.getpid():
+            return owner != PROCESS_ID
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            pass
+        return False
+
+    def claim_orphaned_jobs(self):
+        with self.transaction() as db:
+            rows = db.execute('SELECT jobs.key, jobs.task_id, jobs.request, jobs.owner, jobs.heartbeat, progress.data '
+                              'FROM jobs LEFT JOIN progress ON progress.task_id = jobs.task_id WHERE jobs.owner != ?',
+                              (PROCESS_ID,)).fetchall()
+            cutoff = time.time() - JOB_STALE_SECONDS
+            orphans = []
+            for key, task_id, request, owner, heartbeat, data in rows:
+                if heartbeat > cutoff and not self.owner_gone(owner):
+                    continue
+                status = json.loads(data).get('status') if data else None
+                if status in ('done', 'error'):
+                    # Finished before its owner could release it
+                    db.execute('DELETE FROM jobs WHERE key = ?', (key,))
+                    continue
+                db.execute('UPDATE jobs SET owner = ?, heartbeat = ? WHERE key = ?', (PROCESS_ID, time.time(), key))
+                db.execute(self.SET_PROGRESS, (task_id, json.dumps({'status': 'queued'}), time.time()))
+                orphans.append((task_id, tuple(json.loads(request))))
+            return orphans
+
+    def mark_busy(self, path, busy=True):
+        if busy:
+            self.connection().execute('INSERT OR REPLACE INTO busy_files (path, since) VALUES (?, ?)', (path, time.time()))
+        else:
+            self.connection().execute('DELETE FROM busy_files WHERE path = ?', (path,))
+
+    def busy_paths(self):
+        rows = self.connection().execute('SELECT path FROM busy_files WHERE since > ?', (time.time() - LEASE_MAX_AGE,))
+        return {row[0] for row in rows}
+
+    def schedule_file(self, path, deadline, size, replace=True):
+        verb = 'INSERT OR REPLACE' if replace else 'INSERT OR IGNORE'
+        self.connection().execute(f'{verb} INTO files (path, deadline, size, last_access, expired) VALUES (?, ?, ?, ?, 0)',
+                                  (path, deadline, size, time.time()))
+
+    def acquire_lease(self, path):
+        with self.transaction() as db:
+            db.execute('UPDATE files SET last_access = ? WHERE path = ?', (time.time(), path))
+            return db.execute('INSERT INTO leases (path, acquired) VALUES (?, ?)', (path, time.time())).lastrowid
+
+    def release_lease(self, lease_id):
+        self.connection().execute('DELETE FROM leases WHERE id = ?', (lease_id,))
+
+    def next_deadline(self):
+        row = self.connection().execute('SELECT MIN(deadline) FROM files WHERE expired = 0').fetchone()
+        return row[0]
+
+    def claim_expired_files(self, now):
+        cutoff = time.time() - LEASE_MAX_AGE
+        with self.transaction() as db:
+            db.execute(f'UPDATE files SET expired = 1 WHERE deadline <= ? AND EXISTS ({self.LIVE_LEASE})', (now, cutoff))
+            rows = db.execute('SELECT path FROM files WHERE deadline <= ? AND expired = 0', (now,)).fetchall()
+            db.execute('DELETE FROM files WHERE deadline <= ? AND expired = 0', (now,))
+            return [row[0] for row in rows]
+
+    def claim_released_file(self, path):
+        cutoff = time.time() - LEASE_MAX_AGE
+        with self.transaction() as db:
+            deleted = db.execute(f'DELETE FROM files WHERE path = ? AND expired = 1 AND NOT EXISTS ({self.LIVE_LEASE})',
+                                 (path, cutoff)).rowcount
+            return deleted > 0
+
+    def claim_over_quota(self, quota_bytes):
+        cutoff = time.time() - LEASE_MAX_AGE
+        with self.transaction() as db:
+            total = db.execute('SELECT COALESCE(SUM(size), 0) FROM files').fetchone()[0]
+            if total <= quota_bytes:
+                return []
+            claimed = []
+            rows = db.execute(f'SELECT path, size FROM files WHERE NOT EXISTS ({self.LIVE_LEASE}) ORDER BY last_access',
+                              (cutoff,)).fetchall()
+            for path, size in rows:
+                if total <= quota_bytes:
+                    break
+                total -= size
+                claimed.append(path)
+            db.executemany('DELETE FROM files WHERE path = ?', [(path,) for path in claimed])
+            return claimed
+
+    def cache_get(self, key):
+        row = self.connection().execute('SELECT path, filename, size FROM cache_entries WHERE key = ?', (key,)).fetchone()
+        return dict(zip(('path', 'filename', 'size'), row)) if row else None
+
+    def cache_put(self, key, entry, max_bytes):
+        with self.transaction() as db:
+            db.execute('INSERT OR REPLACE INTO cache_entries (key, path, filename, size, last_access) VALUES (?, ?, ?, ?, ?)',
+                       (key, entry['path'], entry['filename'], entry['size'], time.time()))
+            total = db.execute('SELECT COALESCE(SUM(size), 0) FROM cache_entries').fetchone()[0]
+            if total <= max_bytes:
+                return []
+            evicted = []
+            rows = db.execute('SELECT key, path, filename, size FROM cache_entries WHERE key != ? ORDER BY last_access',
+                              (key,)).fetchall()
+            for old_key, path, filename, size in rows:
+                if total <= max_bytes:
+                    break
+                total -= size
+                evicted.append((old_key, {'path': path, 'filename': filename, 'size': size}))
+            db.executemany('DELETE FROM cache_entries WHERE key = ?', [(old_key,) for old_key, _ in evicted])
+            return [old for _, old in evicted]
+
+    def cache_touch(self, accessed):
+        self.connection().executemany('UPDATE cache_entries SET last_access = MAX(last_access, ?) WHERE key = ?',
+                                      [(when, key) for key, when in accessed.items()])
+
+    def cache_remove(self, key):
+        self.connection().execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+
+    def cache_summary(self):
+        return tuple(self.connection().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries').fetchone())
@@ -0,0 +1,61 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Prometheus metrics for GET /metrics. Values are per process: with several uvicorn
+# workers each scrape reports the worker that answered it (see musicdl_process_info).
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+RTF_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+metrics_lock = threading.Lock()
+
+class Histogram:
+    """Prometheus histogram, optionally split by one label."""
+    def __init__(self, name, documentation, buckets, label=None):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.label = label
+        self.series = {}  # label value -> [per-bucket counts, sum, count]
+
+    def observe(self, value, label_value=''):
+        with metrics_lock:
+            series = self.series.setdefault(label_value, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, label_value=''):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, label_value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with metrics_lock:
+            for label_value, (counts, total, count) in sorted(self.series.items()):
+                labels = f'{self.label}="{label_value}",' if self.label else ''
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{labels}le="{bound}"}} {bucket_count}')
+                lines.append(f'{self.name}_bucket{{{labels}le="+Inf"}} {count}')
+                suffix = f'{{{labels.rstrip(",")}}}' if labels else ''
+                lines.append(f"{self.name}_sum{suffix} {total}")
+                lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+stage_seconds = Histogram('musicdl_stage_seconds', 'Time spent in each stage of the download pipeline.', STAGE_BUCKETS, label='stage')
+transcode_rtf = Histogram('musicdl_transcode_realtime_factor', 'Seconds of media re-encoded per second of ffmpeg time (stream copies excluded).', RTF_BUCKETS)
+zip_seconds = Histogram('musicdl_zip_stream_seconds', 'Time to stream a playlist ZIP to the client.', STAGE_BUCKETS)
+metrics_counters = {'bytes_downloaded': 0, 'active_workers': 0}
+
+def count_metric(name, amount=1):
+    with metrics_lock:
+        metrics_counters[name] += amount
+
+def counter_values():
+    with metrics_lock:
+        return dict(metrics_counters)
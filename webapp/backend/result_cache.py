@@ -0,0 +1,99 @@
+import os
+import re
+import time
+import shutil
+import threading
+
+# Cache hits are recorded in memory and written to the job store after this many of them
+CACHE_SAVE_EVERY_HITS = 32
+
+def link_or_copy(src, dest):
+    """Hard-link src to dest, copying when the filesystem cannot link."""
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+class ResultCache:
+    """Persistent, size-bounded LRU cache of finished (converted and tagged) files,
+    keyed by (extractor, video id, format, quality). The index lives in the job
+    store, so every worker sees and evicts the same entries."""
+    def __init__(self, store, directory, max_bytes):
+        self.store = store
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.accessed = {}  # key -> last hit not yet written to the store
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(extractor, video_id, format, quality):
+        if not extractor or not video_id:
+            return None
+        return re.sub(r'[^\w.-]', '_', f"{extractor}-{video_id}-{format}-{quality}")
+
+    def flush(self):
+        with self.lock:
+            accessed, self.accessed = self.accessed, {}
+        if accessed:
+            self.store.cache_touch(accessed)
+
+    def get(self, key):
+        if not key:
+            return None
+        entry = self.store.cache_get(key)
+        if entry is None or not os.path.exists(entry['path']):
+            if entry is not None:
+                self.store.cache_remove(key)
+            with self.lock:
+                self.misses += 1
+            return None
+        # Recency is kept in memory and written to the store in batches
+        with self.lock:
+            self.hits += 1
+            self.accessed[key] = time.time()
+            flush = len(self.accessed) >= CACHE_SAVE_EVERY_HITS
+        if flush:
+            self.flush()
+        return entry
+
+    def put(self, key, source_path):
+        if not key:
+            return
+        cached_path = os.path.join(self.directory, key + os.path.splitext(source_path)[1])
+        try:
+            if os.path.exists(cached_path):
+                os.remove(cached_path)
+            link_or_copy(source_path, cached_path)
+            size = os.path.getsize(cached_path)
+        except OSError as e:
+            print(f"[CACHE ERROR] Could not cache {source_path}: {e}")
+            return
+        # Pending hits go first so eviction sees current recency
+        self.flush()
+        entry = {'path': cached_path, 'filename': os.path.basename(source_path), 'size': size}
+        for evicted in self.store.cache_put(key, entry, self.max_bytes):
+            try:
+                os.remove(evicted['path'])
+            except OSError:
+                pass
+
+    def deliver(self, entry, directory):
+        """Materialize a cached file in directory and return its path there."""
+        dest = os.path.join(directory, entry['filename'])
+        if not os.path.exists(dest):
+            link_or_copy(entry['path'], dest)
+        return dest
+
+    def stats(self):
+        entries, size = self.store.cache_summary()
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': entries,
+                'bytes': size,
+            }
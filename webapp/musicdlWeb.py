@@ -1,26 +1,43 @@
 from fastapi import FastAPI, Request, Form, BackgroundTasks, UploadFile, File
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, JSONResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse, Response, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.background import BackgroundTask
 import os
 import yt_dlp
+from yt_dlp.extractor import gen_extractor_classes
 import uuid
 from typing import Dict
 import threading
+import queue
+import asyncio
+import json
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote, urlparse, parse_qs
 import time
 import logging
 import shutil
 import zipfile
 import traceback
 import tempfile
-from mutagen.easyid3 import EasyID3
-from mutagen.flac import FLAC
-from mutagen.mp4 import MP4
-from mutagen.oggvorbis import OggVorbis
+import sys
 
 musicdlWeb = FastAPI()
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Shared with the desktop app
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'MusicDL'))
+from downloader.tagging import TagEmbedPP, ffmpeg_padding_args
+from downloader.remux import RemuxOrExtractAudioPP, audio_format_selector
+from downloader.events import TrackReadyPP
+# Job state, file expiry, the result cache and metrics live in this app's backend package
+sys.path.insert(0, BASE_DIR)
+from backend.job_store import JOB_HEARTBEAT_INTERVAL, MemoryJobStore, SQLiteJobStore
+from backend.file_expiry import FileExpiryScheduler
+from backend.result_cache import ResultCache
+from backend.metrics import stage_seconds, transcode_rtf, zip_seconds, count_metric, counter_values
 DOWNLOADS_DIR = os.path.join(BASE_DIR, 'downloads')
 os.makedirs(DOWNLOADS_DIR, exist_ok=True)
 
@@ -32,230 +49,374 @@ templates = Jinja2Templates(directory=os.path.join(BASE_DIR, 'templates'))
 
 logging.basicConfig(level=logging.INFO)
 
-# In-memory set to track files being downloaded/converted
-in_progress_files = set()
+# Task progress, single-flight job keys, files being written, file expiry records and
+# file leases live in a JobStore so several uvicorn workers (or a restarted server)
+# share one view. SQLite in WAL mode is the default; MUSICDL_JOB_STORE=memory keeps
+# everything in this process.
+JOB_STORE = os.environ.get('MUSICDL_JOB_STORE', 'sqlite')
+JOB_DB_PATH = os.environ.get('MUSICDL_JOB_DB', os.path.join(BASE_DIR, 'jobs.sqlite3'))
 
-def cleanup_downloads_periodically():
-    while True:
-        try:
-            for f in os.listdir(DOWNLOADS_DIR):
-                file_path = os.path.join(DOWNLOADS_DIR, f)
-                if os.path.isfile(file_path) and file_path not in in_progress_files:
-                    os.remove(file_path)
-            logging.info("[Cleanup] Downloads folder cleared.")
-        except Exception as e:
-            logging.error(f"[Cleanup] Error clearing downloads: {e}")
-        time.sleep(1800)  # 30 minutes
+job_store = MemoryJobStore() if JOB_STORE == 'memory' else SQLiteJobStore(JOB_DB_PATH)
+
+# Downloaded files expire after FILE_TTL seconds, or earlier when the folder exceeds its quota
+FILE_TTL = int(os.environ.get('MUSICDL_FILE_TTL', '1800'))
+DISK_QUOTA_BYTES = int(os.environ.get('MUSICDL_DISK_QUOTA_MB', '5120')) * 1024 * 1024
+file_expiry = FileExpiryScheduler(job_store, DISK_QUOTA_BYTES, FILE_TTL)
+
+# Files left over from a previous run expire relative to when they were written
+for f in os.listdir(DOWNLOADS_DIR):
+    file_path = os.path.join(DOWNLOADS_DIR, f)
+    if os.path.isfile(file_path):
+        file_expiry.schedule(file_path, deadline=os.path.getmtime(file_path) + FILE_TTL, replace=False)
 
-# Start the cleanup thread when the app launches
-cleanup_thread = threading.Thread(target=cleanup_downloads_periodically, daemon=True)
-cleanup_thread.start()
+# Start the expiry thread when the app launches
+file_expiry.start()
 
-# In-memory progress tracking
-download_progress: Dict[str, dict] = {}
+def schedule_file_cleanup(filepath, delay=FILE_TTL):
+    file_expiry.schedule(filepath, delay)
 
-# Per-file delayed cleanup
-cleanup_timers = {}
-def schedule_file_cleanup(filepath, delay=1800):
-    def delete_file():
+def get_progress(task_id):
+    return job_store.get_progress(task_id) or {}
+
+# Progress subscribers (SSE streams) in this process waiting for updates, per task.
+# Updates made by other workers are picked up by re-reading the store.
+progress_subscribers: Dict[str, set] = {}
+progress_lock = threading.Lock()
+PROGRESS_POLL_INTERVAL = 0.5
+
+def update_progress(task_id, prog):
+    """Store the task's progress and wake any SSE streams watching it."""
+    job_store.set_progress(task_id, prog)
+    with progress_lock:
+        subscribers = list(progress_subscribers.get(task_id, ()))
+    for loop, event in subscribers:
         try:
-            if os.path.exists(filepath) and filepath not in in_progress_files:
-                os.remove(filepath)
-                print(f"[CLEANUP] Deleted: {filepath}")
-        except Exception as e:
-            print(f"[CLEANUP ERROR] Could not delete {filepath}: {e}")
-    def timer_func():
-        time.sleep(delay)
-        delete_file()
-    t = threading.Thread(target=timer_func, daemon=True)
-    t.start()
-    cleanup_timers[filepath] = t
-
-def yt_dlp_progress_hook(task_id, current_track=None, total_tracks=None, current_title=None):
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            # The subscriber's event loop has already shut down
+            pass
+
+def subscribe_progress(task_id):
+    """Register the running event loop for wake-ups on this task's progress updates."""
+    subscriber = (asyncio.get_running_loop(), asyncio.Event())
+    with progress_lock:
+        progress_subscribers.setdefault(task_id, set()).add(subscriber)
+    return subscriber
+
+def unsubscribe_progress(task_id, subscriber):
+    with progress_lock:
+        subscribers = progress_subscribers.get(task_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del progress_subscribers[task_id]
+
+def yt_dlp_progress_hook(task_id, current_track=None, total_tracks=None, current_title=None, timer=None):
     def hook(d):
-        prog = download_progress.get(task_id, {})
+        prog = get_progress(task_id)
+        info = d.get('info_dict', {})
+        track = current_track or info.get('playlist_index')
+        tracks = total_tracks or info.get('n_entries') or info.get('playlist_count')
         if d['status'] == 'downloading':
+            if timer is not None and timer.pop('extracting', None) is not None:
+                # Extraction and format negotiation end when the first byte arrives
+                stage_seconds.observe(time.monotonic() - timer['track_started'], 'extract')
             total = d.get('total_bytes') or d.get('total_bytes_estimate') or 1
             downloaded = d.get('downloaded_bytes', 0)
             percent = int(downloaded / total * 100) if total else 0
+            # Only publish when the visible percentage or track changes
+            if prog.get('percent') == percent and prog.get('current_track') == track and prog.get('status') == 'downloading':
+                return
             prog.update({
                 'status': 'downloading',
                 'filename': d.get('filename', ''),
                 'percent': percent,
                 'downloaded': downloaded,
                 'total': total,
-                'details': d.get('info_dict', {}).get('title', ''),
-                'format': d.get('info_dict', {}).get('ext', ''),
+                'details': info.get('title', ''),
+                'format': info.get('ext', ''),
             })
-            if current_track is not None and total_tracks is not None:
-                prog['current_track'] = current_track
-                prog['total_tracks'] = total_tracks
-                prog['current_title'] = current_title
-            download_progress[task_id] = prog
+            if track is not None and tracks is not None:
+                prog['current_track'] = track
+                prog['total_tracks'] = tracks
+                prog['current_title'] = current_title or info.get('title', '')
+            update_progress(task_id, prog)
         elif d['status'] == 'finished':
+            # A file yt-dlp found already on disk finishes without elapsed or downloaded_bytes
+            if d.get('elapsed') is not None:
+                stage_seconds.observe(d['elapsed'], 'download')
+                count_metric('bytes_downloaded', d.get('downloaded_bytes') or 0)
+            # The raw download is complete; postprocessing (conversion) follows,
+            # so the job as a whole is still in progress
             prog.update({
-                'status': 'finished',
+                'status': 'downloading',
                 'filename': d.get('filename', ''),
-                'details': d.get('info_dict', {}).get('title', ''),
-                'format': d.get('info_dict', {}).get('ext', ''),
+                'percent': 100,
+                'details': info.get('title', ''),
+                'format': info.get('ext', ''),
             })
-            download_progress[task_id] = prog
+            update_progress(task_id, prog)
+    return hook
+
+def yt_dlp_postprocessor_hook(task_id, converter=None):
+    """Progress hook for postprocessors; converter is the job's RemuxOrExtractAudioPP, if any."""
+    started = {}
+
+    def hook(d):
+        prog = get_progress(task_id)
+        info = d.get('info_dict', {})
+        title = info.get('title', '')
+        postprocessor = d.get('postprocessor', 'postprocessing')
+        if d['status'] == 'started':
+            started[postprocessor] = time.monotonic()
+        elif d['status'] == 'finished' and postprocessor in started:
+            elapsed = time.monotonic() - started.pop(postprocessor)
+            stage_seconds.observe(elapsed, postprocessor)
+            # yt-dlp reports postprocessors by pp_key(), which drops the 'FFmpeg' class prefix.
+            # Stream copies finish far faster than real time and are left out of the RTF.
+            if (converter is not None and postprocessor == converter.pp_key() and converter.encoded
+                    and info.get('duration') and elapsed > 0):
+                transcode_rtf.observe(info['duration'] / elapsed)
+        if d['status'] == 'started':
+            prog.update({'status': 'downloading', 'details': f"{title} ({postprocessor})"})
+            update_progress(task_id, prog)
+        elif d['status'] == 'finished':
+            prog.update({'status': 'downloading', 'details': title})
+            update_progress(task_id, prog)
     return hook
 
 @musicdlWeb.get('/', response_class=HTMLResponse)
 def home(request: Request):
     return templates.TemplateResponse('index.html', {"request": request})
 
-def tag_audio_file(filepath, metadata, audio_format):
-    try:
-        if audio_format == 'mp3':
-            audio = EasyID3(filepath)
-            if 'title' in metadata: audio['title'] = metadata['title']
-            if 'artist' in metadata: audio['artist'] = metadata['artist']
-            if 'album' in metadata: audio['album'] = metadata['album']
-            if 'date' in metadata: audio['date'] = metadata['date']
-            if 'genre' in metadata: audio['genre'] = metadata['genre']
-            audio.save()
-        elif audio_format == 'flac':
-            audio = FLAC(filepath)
-            for k, v in metadata.items():
-                audio[k] = v
-            audio.save()
-        elif audio_format == 'm4a':
-            audio = MP4(filepath)
-            if 'title' in metadata: audio['nam'] = [metadata['title']]
-            if 'artist' in metadata: audio['ART'] = [metadata['artist']]
-            if 'album' in metadata: audio['alb'] = [metadata['album']]
-            if 'date' in metadata: audio['day'] = [metadata['date']]
-            if 'genre' in metadata: audio['gen'] = [metadata['genre']]
-            audio.save()
-        elif audio_format == 'ogg':
-            audio = OggVorbis(filepath)
-            for k, v in metadata.items():
-                audio[k] = v
-            audio.save()
-        return True
-    except Exception as e:
-        print(f"[TAGGING ERROR] {filepath}: {e}")
-        return False
+CACHE_DIR = os.path.join(BASE_DIR, 'cache')
+os.makedirs(CACHE_DIR, exist_ok=True)
+CACHE_MAX_BYTES = int(os.environ.get('MUSICDL_CACHE_MB', '2048')) * 1024 * 1024
+AUDIO_QUALITY = '192'
+result_cache = ResultCache(job_store, CACHE_DIR, CACHE_MAX_BYTES)
+
+YOUTUBE_VIDEO_ID_RE = re.compile(r'[0-9A-Za-z_-]{11}')
+
+def single_video_url(url):
+    """The video a single-mode download fetches: like yt-dlp's noplaylist, a watch or
+    youtu.be link that also names a playlist or radio mix (list=...) means its video."""
+    url = url.strip()
+    parsed = urlparse(url)
+    host = (parsed.hostname or '').lower()
+    video_id = None
+    if host == 'youtu.be':
+        video_id = parsed.path.strip('/').split('/')[0]
+    elif host == 'youtube.com' or host.endswith('.youtube.com'):
+        video_id = parse_qs(parsed.query).get('v', [None])[0]
+    if video_id and YOUTUBE_VIDEO_ID_RE.fullmatch(video_id):
+        return f'https://www.youtube.com/watch?v={video_id}'
+    return url
+
+def url_cache_key(url, format):
+    """Derive the cache key for a single-video URL without any network access."""
+    url = single_video_url(url)
+    for ie in gen_extractor_classes():
+        if ie.ie_key() != 'Generic' and ie.suitable(url):
+            return ResultCache.make_key(ie.ie_key(), ie.get_temp_id(url), format, AUDIO_QUALITY)
+    return None
 
-def wait_for_file_release(filepath, timeout=10):
-    """Wait until the file is not locked (up to timeout seconds)."""
-    import time
-    for _ in range(timeout * 2):
+def run_download_job(task_id, youtube_url, format, download_type):
+    """Download, convert and tag one queued job, publishing each track as soon as it is ready."""
+    converted_files = []
+    job_dir = os.path.join(IN_PROGRESS_DIR, task_id)
+    timer = {'track_started': time.monotonic(), 'extracting': True}
+
+    def publish_track(final_name):
+        converted_files.append(final_name)
+        # Schedule cleanup for this file
+        schedule_file_cleanup(final_name)
+        prog = get_progress(task_id)
+        prog['downloaded_files'] = [os.path.basename(f) for f in converted_files]
+        update_progress(task_id, prog)
+
+    def deliver_cached(entry):
         try:
-            with open(filepath, 'ab'):
-                return True
-        except OSError:
-            time.sleep(0.5)
-    return False
+            publish_track(result_cache.deliver(entry, DOWNLOADS_DIR))
+            return True
+        except OSError as e:
+            print(f"[CACHE ERROR] Could not deliver {entry['path']}: {e}")
+            return False
+
+    checked_keys = set()
+
+    def skip_cached(info, incomplete=False):
+        # yt-dlp match_filter: playlist entries are checked before extraction (incomplete),
+        # so cached tracks skip extraction, download and ffmpeg entirely
+        key = ResultCache.make_key(info.get('extractor_key') or info.get('ie_key'), info.get('id'), format, AUDIO_QUALITY)
+        if not key or key in checked_keys:
+            return None
+        checked_keys.add(key)
+        entry = result_cache.get(key)
+        if entry is not None and deliver_cached(entry):
+            return 'Served from result cache'
+        return None
+
+    def track_metadata(entry):
+        return {
+            'title': entry.get('title', ''),
+            'artist': entry.get('uploader', ''),
+            'album': entry.get('album', ''),
+            'date': entry.get('upload_date', ''),
+            'genre': entry.get('genre', '')
+        }
+
+    def finalize_track(entry):
+        in_progress_path = entry.get('filepath')
+        if not in_progress_path or not os.path.exists(in_progress_path):
+            return
+        final_name = os.path.join(DOWNLOADS_DIR, os.path.basename(in_progress_path))
+        job_store.mark_busy(final_name)
+        # after_move runs once ffmpeg and every other postprocessor are done, so the file is complete
+        # Move file from in_progress to downloads
+        try:
+            with stage_seconds.time('move'):
+                shutil.move(in_progress_path, final_name)
+        except Exception as e:
+            print(f"[MOVE ERROR] Could not move {in_progress_path} to {final_name}: {e}")
+            job_store.mark_busy(final_name, False)
+            return
+        result_cache.put(ResultCache.make_key(entry.get('extractor_key'), entry.get('id'), format, AUDIO_QUALITY), final_name)
+        job_store.mark_busy(final_name, False)
+        publish_track(final_name)
+        # The next playlist entry starts extracting now
+        timer.update({'track_started': time.monotonic(), 'extracting': True})
 
-@musicdlWeb.post('/download')
-def download(request: Request, youtube_url: str = Form(...), format: str = Form('mp3'), download_type: str = Form('single')):
-    import traceback
-    import subprocess
-    task_id = str(uuid.uuid4())
-    download_progress[task_id] = {'status': 'queued'}
     try:
-        outtmpl = os.path.join(IN_PROGRESS_DIR, '%(playlist_index)s-%(title)s-%(id)s.%(ext)s')
+        # Each job downloads into its own folder so concurrent jobs never share partial files.
+        # A requeued job reuses its task id: with nooverwrites and nopart yt-dlp would take a
+        # file the crashed attempt left half-written for a finished download, so start empty.
+        shutil.rmtree(job_dir, ignore_errors=True)
+        os.makedirs(job_dir, exist_ok=True)
+        outtmpl = os.path.join(job_dir, '%(playlist_index)s-%(title)s-%(id)s.%(ext)s')
+        extract_audio = format in ['mp3', 'm4a', 'flac', 'wav', 'opus', 'ogg', 'aac']
+        # Stream-copies when the selected source codec already fits the format
+        converter = RemuxOrExtractAudioPP(preferredcodec=format, preferredquality=AUDIO_QUALITY) if extract_audio else None
         ydl_opts = {
-            'format': 'bestaudio/best' if format != 'mp4' else 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/mp4',
+            'format': audio_format_selector(format) if format != 'mp4' else 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/mp4',
             'outtmpl': outtmpl,
             'noplaylist': download_type == 'single',
             'quiet': True,
             'nooverwrites': True,
             'nopart': True,
+            'progress_hooks': [yt_dlp_progress_hook(task_id, timer=timer)],
+            'postprocessor_hooks': [yt_dlp_postprocessor_hook(task_id, converter)],
+            'match_filter': skip_cached,
         }
-        if format in ['mp3', 'm4a', 'flac', 'wav', 'opus', 'ogg', 'aac']:
-            ydl_opts['postprocessors'] = [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': format,
-                'preferredquality': '192',
-            }]
-        download_progress[task_id] = {'status': 'downloading', 'percent': 0}
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(youtube_url, download=True)
-            entries = info['entries'] if 'entries' in info else [info]
-            converted_files = []
-            for idx, entry in enumerate(entries):
-                base = os.path.splitext(ydl.prepare_filename(entry))[0]
-                in_progress_name = f"{base}.{format}"
-                final_name = os.path.join(DOWNLOADS_DIR, os.path.basename(in_progress_name))
-                in_progress_path = os.path.join(IN_PROGRESS_DIR, os.path.basename(in_progress_name))
-                if not os.path.exists(in_progress_path):
-                    continue
-                in_progress_files.add(final_name)
-                if not wait_for_file_release(in_progress_path):
-                    print(f"[ERROR] File is locked and cannot be accessed: {in_progress_path}")
-                    in_progress_files.remove(final_name)
-                    continue
-                # Move file from in_progress to downloads
-                try:
-                    shutil.move(in_progress_path, final_name)
-                except Exception as e:
-                    print(f"[MOVE ERROR] Could not move {in_progress_path} to {final_name}: {e}")
-                    in_progress_files.remove(final_name)
-                    continue
-                metadata = {
-                    'title': entry.get('title', ''),
-                    'artist': entry.get('uploader', ''),
-                    'album': entry.get('album', ''),
-                    'date': entry.get('upload_date', ''),
-                    'genre': entry.get('genre', '')
-                }
-                tag_audio_file(final_name, metadata, format)
-                converted_files.append(final_name)
-                # Schedule cleanup for this file
-                schedule_file_cleanup(final_name, delay=1800)
-                in_progress_files.remove(final_name)
-                download_progress[task_id] = {
-                    'status': 'downloading',
-                    'percent': int((idx+1)/len(entries)*100),
-                    'current_track': idx+1,
-                    'total_tracks': len(entries),
-                    'current_title': entry.get('title', '')
-                }
-            # Create ZIP if playlist
-            zip_url = None
-            if len(converted_files) > 1:
-                zip_name = f"playlist_{task_id}.zip"
-                zip_path = os.path.join(DOWNLOADS_DIR, zip_name)
-                with zipfile.ZipFile(zip_path, 'w') as zipf:
-                    for f in converted_files:
-                        zipf.write(f, arcname=os.path.basename(f))
-                zip_url = f"/files/{zip_name}"
-                # Schedule cleanup for ZIP
-                schedule_file_cleanup(zip_path, delay=1800)
-            download_progress[task_id] = {
-                'status': 'done',
-                'downloaded_files': [os.path.basename(f) for f in converted_files],
-                'zip_url': zip_url,
-                'is_playlist': len(converted_files) > 1
-            }
-            print(f"[SUCCESS] Downloaded and converted: {converted_files}")
+        if extract_audio:
+            # Header room for the tags TagEmbedPP writes right after conversion
+            ydl_opts['postprocessor_args'] = ffmpeg_padding_args()
+        is_playlist = download_type != 'single'
+        update_progress(task_id, {
+            'status': 'downloading',
+            'percent': 0,
+            'downloaded_files': [],
+            # Playlist archives are streamed while tracks are still being downloaded
+            'zip_url': f"/zip/{task_id}" if is_playlist else None,
+            'is_playlist': is_playlist
+        })
+        # A cached single video needs no extraction at all
+        cached = None
+        if not is_playlist:
+            key = url_cache_key(youtube_url, format)
+            if key:
+                checked_keys.add(key)
+                cached = result_cache.get(key)
+        if cached is None or not deliver_cached(cached):
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                if converter is not None:
+                    ydl.add_post_processor(converter, when='post_process')
+                # Tags are written in the job folder, before the track is published or cached
+                ydl.add_post_processor(TagEmbedPP(track_metadata, format), when='post_process')
+                ydl.add_post_processor(TrackReadyPP(finalize_track), when='after_move')
+                ydl.extract_info(youtube_url, download=True)
+        update_progress(task_id, {
+            'status': 'done',
+            'downloaded_files': [os.path.basename(f) for f in converted_files],
+            'zip_url': f"/zip/{task_id}" if len(converted_files) > 1 else None,
+            'is_playlist': len(converted_files) > 1
+        })
+        print(f"[SUCCESS] Downloaded and converted: {converted_files}")
     except Exception as e:
         tb = traceback.format_exc()
         print(f"[DOWNLOAD/CONVERT ERROR] {e}\n{tb}")
-        download_progress[task_id] = {
+        update_progress(task_id, {
             'status': 'error',
             'error': f"{e}\n{tb}"
-        }
+        })
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+# Download job queue drained by a fixed pool of worker threads
+DOWNLOAD_WORKERS = max(1, int(os.environ.get('MUSICDL_DOWNLOAD_WORKERS', '2')))
+download_queue = queue.Queue()
+
+# Jobs queued or running are keyed by what they produce, so identical requests share one task
+def job_key(youtube_url, format, download_type):
+    if download_type == 'single':
+        # Unrecognised URLs fall back to the URL itself rather than merging different requests
+        return (url_cache_key(youtube_url, format) or single_video_url(youtube_url), format, download_type)
+    return (youtube_url.strip(), format, download_type)
+
+def download_worker():
+    while True:
+        task_id, youtube_url, format, download_type = download_queue.get()
+        count_metric('active_workers')
+        try:
+            run_download_job(task_id, youtube_url, format, download_type)
+        finally:
+            count_metric('active_workers', -1)
+            job_store.release_job(task_id)
+            download_queue.task_done()
+
+def job_heartbeat():
+    """Keep this process's jobs claimed and requeue jobs left behind by exited processes."""
+    while True:
+        try:
+            job_store.heartbeat()
+            for task_id, request in job_store.claim_orphaned_jobs():
+                print(f"[QUEUE] Requeueing orphaned job {task_id}: {request[0]}")
+                download_queue.put((task_id, *request))
+        except Exception as e:
+            logging.error(f"[Queue] Job heartbeat failed: {e}")
+        time.sleep(JOB_HEARTBEAT_INTERVAL)
+
+# Start the download workers when the app launches
+download_workers = []
+for _ in range(DOWNLOAD_WORKERS):
+    worker = threading.Thread(target=download_worker, daemon=True)
+    worker.start()
+    download_workers.append(worker)
+# The first beat runs at once, so jobs orphaned by a restart are recovered on startup
+threading.Thread(target=job_heartbeat, daemon=True).start()
+
+@musicdlWeb.post('/download')
+def download(request: Request, youtube_url: str = Form(...), format: str = Form('mp3'), download_type: str = Form('single')):
+    key = job_key(youtube_url, format, download_type)
+    # Attach to an identical job that is already queued or running on any worker
+    new_task_id = str(uuid.uuid4())
+    task_id = job_store.claim_job(key, new_task_id, {'status': 'queued'}, (youtube_url, format, download_type))
+    if task_id == new_task_id:
+        download_queue.put((task_id, youtube_url, format, download_type))
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
         return JSONResponse({'task_id': task_id})
     return RedirectResponse(f'/progress/{task_id}', status_code=303)
 
 @musicdlWeb.get('/progress/{task_id}', response_class=HTMLResponse)
 def progress_page(request: Request, task_id: str):
-    prog = download_progress.get(task_id, {})
+    prog = get_progress(task_id)
     file_url = None
     if prog.get('status') in ('finished', 'done') and prog.get('filename'):
         filename = os.path.basename(prog['filename'])
         file_url = f'/files/{filename}'
     return templates.TemplateResponse('progress.html', {"request": request, "task_id": task_id, "file_url": file_url})
 
-@musicdlWeb.get('/progress/{task_id}/status')
-def progress_status(task_id: str):
-    prog = download_progress.get(task_id, {'status': 'unknown'})
+def progress_payload(task_id):
+    prog = job_store.get_progress(task_id) or {'status': 'unknown'}
     file_url = None
     if prog.get('status') in ('finished', 'done') and prog.get('downloaded_files'):
         # For single file, provide direct link
@@ -263,26 +424,305 @@ def progress_status(task_id: str):
             file_url = f"/files/{prog['downloaded_files'][0]}"
     prog['file_url'] = file_url
     # For playlist, provide zip_url and individual file links
-    return JSONResponse(prog)
+    return prog
+
+@musicdlWeb.get('/progress/{task_id}/status')
+def progress_status(task_id: str):
+    return JSONResponse(progress_payload(task_id))
+
+@musicdlWeb.get('/progress/{task_id}/events')
+async def progress_events(request: Request, task_id: str):
+    """Server-Sent Events stream that pushes each progress change as it happens."""
+    subscriber = subscribe_progress(task_id)
+    event = subscriber[1]
+
+    async def stream():
+        last_data = None
+        last_version = None
+        last_sent = time.monotonic()
+        try:
+            while True:
+                # Clear before reading so an update racing with this read is not lost
+                event.clear()
+                # The store is only touched from worker threads; the full payload is
+                # re-read only when its version has moved
+                version = await asyncio.to_thread(job_store.progress_version, task_id)
+                if version is None or version != last_version:
+                    last_version = version
+                    prog = await asyncio.to_thread(progress_payload, task_id)
+                    data = json.dumps(prog)
+                    if data != last_data:
+                        yield f"data: {data}\n\n"
+                        last_data = data
+                        last_sent = time.monotonic()
+                    if prog['status'] in ('done', 'error', 'unknown'):
+                        break
+                if time.monotonic() - last_sent >= 15:
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+                # Local updates wake us at once; the timeout catches updates from other workers
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=PROGRESS_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                if await request.is_disconnected():
+                    break
+        finally:
+            unsubscribe_progress(task_id, subscriber)
+
+    return StreamingResponse(stream(), media_type='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+class ZipStreamBuffer:
+    """Unseekable sink for zipfile; bytes written are drained into the HTTP response."""
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+ZIP_CHUNK_SIZE = 1024 * 1024
+
+def release_leases(leased):
+    for file_path, lease_id in leased:
+        file_expiry.release(file_path, lease_id)
+
+@musicdlWeb.get('/zip/{task_id}')
+async def stream_zip(request: Request, task_id: str):
+    """Stream a playlist as a ZIP, adding each track as soon as it has been converted."""
+    if await asyncio.to_thread(job_store.get_progress, task_id) is None:
+        return HTMLResponse("File not found", status_code=404)
+    subscriber = subscribe_progress(task_id)
+    event = subscriber[1]
+
+    async def stream():
+        buffer = ZipStreamBuffer()
+        sent = set()
+        leased = []
+        started = time.monotonic()
+        try:
+            # Audio is already compressed, so entries are stored as-is
+            with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as zipf:
+                while True:
+                    event.clear()
+                    prog = await asyncio.to_thread(get_progress, task_id)
+                    pending = [f for f in prog.get('downloaded_files', []) if f not in sent]
+                    # Keep every track of the archive from expiring until the stream ends
+                    for name in pending:
+                        file_path = os.path.join(DOWNLOADS_DIR, name)
+                        leased.append((file_path, await asyncio.to_thread(file_expiry.acquire, file_path)))
+                    for name in pending:
+                        sent.add(name)
+                        file_path = os.path.join(DOWNLOADS_DIR, name)
+                        if not os.path.exists(file_path):
+                            continue
+                        zinfo = zipfile.ZipInfo.from_file(file_path, arcname=name)
+                        zinfo.compress_type = zipfile.ZIP_STORED
+                        with open(file_path, 'rb') as src, zipf.open(zinfo, 'w') as dest:
+                            while True:
+                                chunk = await asyncio.to_thread(src.read, ZIP_CHUNK_SIZE)
+                                if not chunk:
+                                    break
+                                dest.write(chunk)
+                                yield buffer.drain()
+                        yield buffer.drain()
+                    if pending:
+                        continue
+                    if prog.get('status') in ('done', 'error'):
+                        break
+                    try:
+                        await asyncio.wait_for(event.wait(), timeout=PROGRESS_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    if await request.is_disconnected():
+                        return
+            # Closing the archive writes the central directory
+            yield buffer.drain()
+        finally:
+            unsubscribe_progress(task_id, subscriber)
+            # Released off the event loop without awaiting: this also runs when the stream is cancelled
+            if leased:
+                asyncio.get_running_loop().run_in_executor(None, release_leases, leased)
+            zip_seconds.observe(time.monotonic() - started)
+
+    headers = {'Content-Disposition': f'attachment; filename="playlist_{task_id}.zip"'}
+    return StreamingResponse(stream(), media_type='application/zip', headers=headers)
+
+@musicdlWeb.get('/metrics')
+def metrics():
+    """Prometheus text exposition of pipeline stage latencies, queue and cache state."""
+    cache = result_cache.stats()
+    counters = counter_values()
+    lines = [
+        '# HELP musicdl_process_info Process that answered this scrape.',
+        '# TYPE musicdl_process_info gauge',
+        f'musicdl_process_info{{pid="{os.getpid()}"}} 1',
+        '# HELP musicdl_queue_depth Download jobs waiting for a worker.',
+        '# TYPE musicdl_queue_depth gauge',
+        f'musicdl_queue_depth {download_queue.qsize()}',
+        '# HELP musicdl_active_workers Download workers currently running a job.',
+        '# TYPE musicdl_active_workers gauge',
+        f'musicdl_active_workers {counters["active_workers"]}',
+        '# HELP musicdl_workers Size of the download worker pool.',
+        '# TYPE musicdl_workers gauge',
+        f'musicdl_workers {DOWNLOAD_WORKERS}',
+        '# HELP musicdl_downloaded_bytes_total Bytes fetched by yt-dlp.',
+        '# TYPE musicdl_downloaded_bytes_total counter',
+        f'musicdl_downloaded_bytes_total {counters["bytes_downloaded"]}',
+        '# HELP musicdl_cache_hits_total Result cache lookups served from the cache.',
+        '# TYPE musicdl_cache_hits_total counter',
+        f'musicdl_cache_hits_total {cache["hits"]}',
+        '# HELP musicdl_cache_misses_total Result cache lookups that required a download.',
+        '# TYPE musicdl_cache_misses_total counter',
+        f'musicdl_cache_misses_total {cache["misses"]}',
+        '# HELP musicdl_cache_hit_ratio Share of result cache lookups that were hits.',
+        '# TYPE musicdl_cache_hit_ratio gauge',
+        f'musicdl_cache_hit_ratio {cache["hit_rate"]}',
+        '# HELP musicdl_cache_bytes Size of the result cache on disk.',
+        '# TYPE musicdl_cache_bytes gauge',
+        f'musicdl_cache_bytes {cache["bytes"]}',
+    ]
+    for histogram in (stage_seconds, transcode_rtf, zip_seconds):
+        lines.extend(histogram.render())
+    return PlainTextResponse('\n'.join(lines) + '\n', media_type='text/plain; version=0.0.4')
+
+@musicdlWeb.get('/cache/stats')
+def cache_stats():
+    return JSONResponse(result_cache.stats())
 
 @musicdlWeb.get('/files', response_class=HTMLResponse)
 def list_files(request: Request):
     files = [f for f in os.listdir(DOWNLOADS_DIR) if f.lower().endswith(('.mp3', '.mp4'))]
     # Exclude in-progress files
-    files = [f for f in files if os.path.join(DOWNLOADS_DIR, f) not in in_progress_files]
+    busy = job_store.busy_paths()
+    files = [f for f in files if os.path.join(DOWNLOADS_DIR, f) not in busy]
     return templates.TemplateResponse('files.html', {"request": request, "files": files})
 
-@musicdlWeb.get('/files/{filename}')
-def serve_file(filename: str):
+MEDIA_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.m4a': 'audio/mp4',
+    '.flac': 'audio/flac',
+    '.wav': 'audio/wav',
+    '.opus': 'audio/ogg; codecs=opus',
+    '.ogg': 'audio/ogg',
+    '.aac': 'audio/aac',
+    '.mp4': 'video/mp4',
+}
+SEND_CHUNK_SIZE = 256 * 1024
+
+def parse_range(header, size):
+    """Parse a single 'bytes=' Range header into an inclusive (start, end).
+
+    Returns None when the whole file should be sent (no header, or a multi-range
+    request) and raises ValueError when the range cannot be satisfied."""
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    start, _, end = header[len('bytes='):].strip().partition('-')
+    try:
+        if start:
+            start, end = int(start), int(end) if end else size - 1
+        elif end:
+            # Suffix range: the last N bytes
+            start, end = max(0, size - int(end)), size - 1
+        else:
+            return None
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, min(end, size - 1)
+
+class RangeFileResponse(Response):
+    """Sends bytes [start, end] of a file, zero-copy when the ASGI server offers the
+    http.response.zerocopysend extension (sendfile) and in chunks otherwise."""
+    def __init__(self, path, start, end, status_code=200, headers=None, media_type=None, background=None):
+        self.path = path
+        self.start = start
+        self.end = end
+        super().__init__(None, status_code=status_code, headers=headers, media_type=media_type, background=background)
+
+    async def __call__(self, scope, receive, send):
+        await send({'type': 'http.response.start', 'status': self.status_code, 'headers': self.raw_headers})
+        count = self.end - self.start + 1
+        if scope['method'] == 'HEAD' or count <= 0:
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        else:
+            with open(self.path, 'rb') as f:
+                if 'http.response.zerocopysend' in scope.get('extensions', {}):
+                    await send({'type': 'http.response.zerocopysend', 'file': f, 'offset': self.start, 'count': count, 'more_body': False})
+                else:
+                    f.seek(self.start)
+                    while count > 0:
+                        chunk = await asyncio.to_thread(f.read, min(SEND_CHUNK_SIZE, count))
+                        if not chunk:
+                            break
+                        count -= len(chunk)
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': count > 0})
+                    if count > 0:
+                        # The file shrank underneath us; end the body anyway
+                        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        if self.background is not None:
+            await self.background()
+
+@musicdlWeb.api_route('/files/{filename}', methods=['GET', 'HEAD'])
+def serve_file(request: Request, filename: str):
     file_path = os.path.join(DOWNLOADS_DIR, filename)
     # Do not serve in-progress files
-    if file_path in in_progress_files:
+    if file_path in job_store.busy_paths():
         return HTMLResponse("File is still being processed. Please try again later.", status_code=423)
-    if os.path.exists(file_path):
-        ext = os.path.splitext(filename)[1].lower()
-        media_type = 'audio/mpeg' if ext == '.mp3' else 'video/mp4' if ext == '.mp4' else 'application/octet-stream'
-        return FileResponse(file_path, media_type=media_type, filename=filename)
-    return HTMLResponse("File not found", status_code=404)
+    if not os.path.isfile(file_path):
+        return HTMLResponse("File not found", status_code=404)
+    stat = os.stat(file_path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+    headers = {'Accept-Ranges': 'bytes', 'ETag': etag, 'Last-Modified': last_modified}
+    # Conditional requests: If-None-Match takes precedence over If-Modified-Since
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        if etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+            return Response(status_code=304, headers=headers)
+    else:
+        since = request.headers.get('if-modified-since')
+        try:
+            if since and int(stat.st_mtime) <= parsedate_to_datetime(since).timestamp():
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+    ext = os.path.splitext(filename)[1].lower()
+    media_type = MEDIA_TYPES.get(ext, 'application/octet-stream')
+    quoted = quote(filename)
+    if quoted != filename:
+        headers['Content-Disposition'] = f"attachment; filename*=utf-8''{quoted}"
+    else:
+        headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    byte_range = None
+    if_range = request.headers.get('if-range')
+    # A stale If-Range means the client's partial copy is outdated: send the whole file
+    if if_range is None or if_range.strip() in (etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers.get('range'), stat.st_size)
+        except ValueError:
+            headers['Content-Range'] = f"bytes */{stat.st_size}"
+            return Response(status_code=416, headers=headers)
+    if byte_range is None:
+        start, end, status_code = 0, stat.st_size - 1, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        headers['Content-Range'] = f"bytes {start}-{end}/{stat.st_size}"
+    headers['Content-Length'] = str(end - start + 1)
+    # Hold a lease until the response has been sent so the file cannot expire mid-transfer
+    lease_id = file_expiry.acquire(file_path)
+    return RangeFileResponse(file_path, start, end, status_code=status_code, headers=headers, media_type=media_type,
+                             background=BackgroundTask(file_expiry.release, file_path, lease_id))
 
 ALLOWED_FORMATS = ("mp3", "m4a", "flac", "wav", "opus", "ogg", "aac")
 
@@ -290,33 +730,118 @@ ALLOWED_FORMATS = ("mp3", "m4a", "flac", "wav", "opus", "ogg", "aac")
 def convert_page(request: Request):
     return templates.TemplateResponse('convert.html', {"request": request, "formats": ALLOWED_FORMATS})
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Conversions run as ffmpeg subprocesses, at most one per CPU core
+CONVERT_CONCURRENCY = max(1, int(os.environ.get('MUSICDL_CONVERT_WORKERS', str(os.cpu_count() or 1))))
+convert_semaphore = None
+FFMPEG_DURATION_RE = re.compile(r'Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)')
+FFMPEG_TIME_RE = re.compile(r'time=\s*(\d+):(\d+):(\d+(?:\.\d+)?)')
+
+def ffmpeg_seconds(match):
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+async def spool_upload(upload, path):
+    """Copy an upload to disk chunk by chunk without blocking the event loop."""
+    with open(path, "wb") as buffer:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            await asyncio.to_thread(buffer.write, chunk)
+
+async def run_ffmpeg(input_path, output_path, on_progress):
+    """Run ffmpeg as an async subprocess, awaiting on_progress with the percent complete parsed from its stderr."""
+    proc = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-y", "-nostdin", "-i", input_path, output_path,
+        stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+    )
+    duration = None
+    pending = ''
+    log_tail = ''
+    while True:
+        data = await proc.stderr.read(4096)
+        if not data:
+            break
+        text = data.decode('utf-8', errors='replace')
+        log_tail = (log_tail + text)[-2000:]
+        # ffmpeg separates its status updates with carriage returns
+        lines = re.split(r'[\r\n]', pending + text)
+        pending = lines.pop()
+        for line in lines:
+            if duration is None:
+                match = FFMPEG_DURATION_RE.search(line)
+                if match:
+                    duration = ffmpeg_seconds(match)
+            match = FFMPEG_TIME_RE.search(line)
+            if match and duration:
+                await on_progress(min(99, int(ffmpeg_seconds(match) / duration * 100)))
+    returncode = await proc.wait()
+    if returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with status {returncode}: {log_tail.strip()}")
+    await on_progress(100)
+
 @musicdlWeb.post('/convert')
-async def convert_files(request: Request, files: list[UploadFile] = File(...), format: str = Form(...)):
-    converted_files = []
-    for file in files:
-        input_path = os.path.join(DOWNLOADS_DIR, file.filename)
-        with open(input_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        base = os.path.splitext(file.filename)[0]
-        output_path = os.path.join(DOWNLOADS_DIR, f"{base}.{format}")
-        # Convert with ffmpeg
-        import subprocess
+async def convert_files(request: Request, files: list[UploadFile] = File(...), format: str = Form(...), task_id: str = Form('')):
+    global convert_semaphore
+    if convert_semaphore is None:
+        convert_semaphore = asyncio.Semaphore(CONVERT_CONCURRENCY)
+    # The page may pass its own task_id so it can watch per-file progress while waiting
+    if not task_id or await asyncio.to_thread(job_store.get_progress, task_id) is not None:
+        task_id = str(uuid.uuid4())
+    names = [os.path.basename(file.filename) for file in files]
+    file_progress = {name: 0 for name in names}
+    # Store writes run in a thread, one at a time so a stale snapshot never lands last
+    publish_lock = asyncio.Lock()
+
+    async def publish(status='converting', **extra):
+        async with publish_lock:
+            prog = {
+                'status': status,
+                'files': dict(file_progress),
+                'percent': 100 if status == 'done' else int(sum(file_progress.values()) / max(1, len(file_progress))),
+                **extra,
+            }
+            await asyncio.to_thread(update_progress, task_id, prog)
+
+    def progress_callback(name):
+        async def callback(percent):
+            if file_progress[name] != percent:
+                file_progress[name] = percent
+                await publish()
+        return callback
+
+    async def convert_one(file, name):
+        # Uploads are spooled outside DOWNLOADS_DIR so partial files are never served
+        input_path = os.path.join(IN_PROGRESS_DIR, f"{uuid.uuid4().hex}-{name}")
+        # Uploads that share a name and convert at the same time must not write the same output
+        output_name = f"{os.path.splitext(name)[0]}-{uuid.uuid4().hex[:8]}.{format}"
+        output_path = os.path.join(DOWNLOADS_DIR, output_name)
         try:
-            subprocess.run(["ffmpeg", "-y", "-i", input_path, output_path], check=True)
-            # Wait for file release after conversion
-            if not wait_for_file_release(output_path):
-                print(f"[ERROR] Converted file is locked and cannot be accessed: {output_path}")
-                continue
-            converted_files.append(f"/files/{base}.{format}")
+            await spool_upload(file, input_path)
+            async with convert_semaphore:
+                await run_ffmpeg(input_path, output_path, progress_callback(name))
+            await asyncio.to_thread(schedule_file_cleanup, output_path)
             print(f"[SUCCESS] Converted: {output_path}")
+            return f"/files/{output_name}"
         except Exception as e:
             tb = traceback.format_exc()
             print(f"[CONVERT ERROR] {e}\n{tb}")
-        # Remove the uploaded file after conversion
-        try:
-            os.remove(input_path)
-        except Exception:
-            pass
-    # Cleanup non-converted files
-    cleanup_downloads(DOWNLOADS_DIR, allowed_exts=tuple(f".{fmt}" for fmt in ALLOWED_FORMATS))
-    return templates.TemplateResponse('convert_done.html', {"request": request, "files": converted_files}) 
\ No newline at end of file
+            # ffmpeg may have written part of the output before failing
+            try:
+                os.remove(output_path)
+            except OSError:
+                pass
+            return None
+        finally:
+            # Remove the uploaded file after conversion
+            try:
+                os.remove(input_path)
+            except Exception:
+                pass
+
+    await publish()
+    results = await asyncio.gather(*(convert_one(file, name) for file, name in zip(files, names)))
+    converted_files = [url for url in results if url]
+    await publish('done', converted_files=converted_files)
+    return templates.TemplateResponse('convert_done.html', {"request": request, "files": converted_files})
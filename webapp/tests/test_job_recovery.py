@@ -0,0 +1,54 @@
+import os
+import sys
+import json
+
+# The app builds its job store on import; keep it in memory so tests never touch jobs.sqlite3
+os.environ['MUSICDL_JOB_STORE'] = 'memory'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import musicdlWeb
+from backend.job_store import SQLiteJobStore
+
+class FakeYoutubeDL:
+    """Stands in for yt_dlp.YoutubeDL and records the job folder when the download starts."""
+    seen = []
+
+    def __init__(self, opts):
+        self.opts = opts
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_post_processor(self, pp, when='post_process'):
+        pass
+
+    def extract_info(self, url, download=True):
+        self.seen.append(sorted(os.listdir(os.path.dirname(self.opts['outtmpl']))))
+        return {}
+
+def test_requeued_job_discards_partial_download(tmp_path, monkeypatch):
+    store = SQLiteJobStore(str(tmp_path / 'jobs.sqlite3'))
+    task_id = 'crashed-task'
+    request = ('https://www.youtube.com/watch?v=dQw4w9WgXcQ', 'mp3', 'single')
+    # A job whose owner stopped sending heartbeats mid-download
+    store.connection().execute(
+        'INSERT INTO jobs (key, task_id, request, owner, heartbeat) VALUES (?, ?, ?, ?, 0)',
+        (json.dumps(list(musicdlWeb.job_key(*request))), task_id, json.dumps(list(request)), 'elsewhere:1:crashed'))
+    job_dir = os.path.join(musicdlWeb.IN_PROGRESS_DIR, task_id)
+    os.makedirs(job_dir, exist_ok=True)
+    with open(os.path.join(job_dir, 'NA-Song-dQw4w9WgXcQ.webm'), 'wb') as f:
+        f.write(b'\x1a\x45\xdf\xa3' + b'\0' * 64)
+
+    assert store.claim_orphaned_jobs() == [(task_id, request)]
+
+    FakeYoutubeDL.seen = []
+    monkeypatch.setattr(musicdlWeb.yt_dlp, 'YoutubeDL', FakeYoutubeDL)
+    musicdlWeb.run_download_job(task_id, *request)
+
+    # The retry must not find the crashed attempt's file, or yt-dlp would reuse it as finished
+    assert FakeYoutubeDL.seen == [[]]
+    assert musicdlWeb.get_progress(task_id)['status'] == 'done'
+    assert not os.path.exists(job_dir)